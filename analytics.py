@@ -0,0 +1,206 @@
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cache import ReadCache
+from db import connection
+from functions import _from_day, _to_day, get_savings_goal, read_archived, user_db
+from profiling import instrumented
+
+# Loaded series are large (about 14 bytes per row), so only a few are kept
+SERIES_CACHE_SIZE = int(os.environ.get("MYBUDGETMATE_SERIES_CACHE_SIZE", "8"))
+ROLLING_WINDOW = 3
+FORECAST_HISTORY_MONTHS = 3
+
+class UserSeries:
+    # One user's transactions as parallel NumPy arrays: day numbers, amounts
+    # in cents and, for expenses, codes indexing `categories`
+
+    def __init__(self, income_day, income_cents, expense_day, expense_cents, expense_category, categories):
+        self.income_day = income_day
+        self.income_cents = income_cents
+        self.expense_day = expense_day
+        self.expense_cents = expense_cents
+        self.expense_category = expense_category
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.income_day) + len(self.expense_day)
+
+def _parse(text, dtype):
+    # SQLite's group_concat() output parsed in C instead of one tuple per row
+    return np.fromstring(text, dtype=np.int64, sep=",").astype(dtype) if text else np.empty(0, dtype=dtype)
+
+@instrumented
+def load_series(user_id):
+    # SQLite columns come back as one comma-separated string per category, read
+    # off the covering indexes; both group_concat()s see the rows in the same
+    # order. group_concat() skips NULLs, so legacy rows without a day or amount
+    # are left out or the two strings would no longer line up.
+    with connection(user_db(user_id)) as conn:
+        income_days, income_cents = conn.execute(
+            "SELECT group_concat(day), group_concat(amount_cents) FROM income "
+            "WHERE user_id=? AND day IS NOT NULL AND amount_cents IS NOT NULL", (user_id,)
+        ).fetchone()
+        groups = conn.execute(
+            "SELECT category, group_concat(day), group_concat(amount_cents) FROM expenses "
+            "WHERE user_id=? AND day IS NOT NULL AND amount_cents IS NOT NULL GROUP BY category", (user_id,)
+        ).fetchall()
+
+    categories = {category: code for code, (category, _, _) in enumerate(groups)}
+    income_day, income_cents = [_parse(income_days, np.int32)], [_parse(income_cents, np.int64)]
+    expense_day = [_parse(group_days, np.int32) for _, group_days, _ in groups]
+    expense_cents = [_parse(cents, np.int64) for _, _, cents in groups]
+    expense_category = [np.full(len(part), code, dtype=np.int16) for code, part in enumerate(expense_day)]
+
+    # Archived months come straight from the Parquet columns
+    archived = read_archived('income', user_id, columns=["day", "amount_cents"]).dropna()
+    income_day.append(archived["day"].to_numpy(np.int32))
+    income_cents.append(archived["amount_cents"].to_numpy(np.int64))
+    archived = read_archived('expense', user_id, columns=["day", "amount_cents", "category"]).dropna(
+        subset=["day", "amount_cents"])
+    if len(archived):
+        codes, names = pd.factorize(archived["category"], use_na_sentinel=False)
+        known = np.array([categories.setdefault(None if pd.isna(name) else name, len(categories)) for name in names],
+                         dtype=np.int16)
+        expense_day.append(archived["day"].to_numpy(np.int32))
+        expense_cents.append(archived["amount_cents"].to_numpy(np.int64))
+        expense_category.append(known[codes])
+
+    return UserSeries(
+        _join(income_day, np.int32), _join(income_cents, np.int64),
+        _join(expense_day, np.int32), _join(expense_cents, np.int64), _join(expense_category, np.int16),
+        list(categories),
+    )
+
+def _join(parts, dtype):
+    return np.concatenate(parts).astype(dtype, copy=False) if parts else np.empty(0, dtype=dtype)
+
+_series_cache = ReadCache(maxsize=SERIES_CACHE_SIZE)
+
+def cached_series(user_id, version=None):
+    # load_series() reused until the user's data version changes
+    return _series_cache.call(load_series, user_id, version=version)
+
+def _months(days):
+    # Day numbers -> months since 1970-01 (vectorized)
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def _month_number(value):
+    # Unix day number or "YYYY-MM" -> months since 1970-01
+    if not isinstance(value, (int, np.integer)):
+        value = _to_day(f"{value}-01")
+    day = _from_day(int(value))
+    return (day.year - 1970) * 12 + day.month - 1
+
+def _month_start(month):
+    return int(np.datetime64(int(month), "M").astype("datetime64[D]").astype(np.int64))
+
+def _month_name(month):
+    return f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+
+def rolling_average(values, window=ROLLING_WINDOW):
+    # Trailing mean over `window` points; the first points average what exists
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+def monthly_trend(series, window=ROLLING_WINDOW):
+    # Income, expense and net per calendar month (gaps filled with zeros) plus
+    # their rolling averages; amounts in rupees
+    income_months, expense_months = _months(series.income_day), _months(series.expense_day)
+    if not len(income_months) and not len(expense_months):
+        return {"months": [], "income": [], "expense": [], "net": [],
+                "rolling_income": [], "rolling_expense": [], "rolling_net": []}
+
+    first = min(m.min() for m in (income_months, expense_months) if len(m))
+    last = max(m.max() for m in (income_months, expense_months) if len(m))
+    size = int(last - first + 1)
+    income = np.bincount(income_months - first, weights=series.income_cents, minlength=size) / 100
+    expense = np.bincount(expense_months - first, weights=series.expense_cents, minlength=size) / 100
+    net = income - expense
+    return {
+        "months": [_month_name(m) for m in range(int(first), int(last) + 1)],
+        "income": income.round(2).tolist(),
+        "expense": expense.round(2).tolist(),
+        "net": net.round(2).tolist(),
+        "rolling_income": rolling_average(income, window).round(2).tolist(),
+        "rolling_expense": rolling_average(expense, window).round(2).tolist(),
+        "rolling_net": rolling_average(net, window).round(2).tolist(),
+    }
+
+def category_deltas(series, month):
+    # Spend per category in `month` against the month before, largest move
+    # first: [{category, current, previous, delta, change}], change in % or None
+    month = _month_number(month)
+    months = _months(series.expense_day)
+    size = len(series.categories)
+    current = np.bincount(series.expense_category[months == month], weights=series.expense_cents[months == month],
+                          minlength=size) / 100
+    previous = np.bincount(series.expense_category[months == month - 1],
+                           weights=series.expense_cents[months == month - 1], minlength=size) / 100
+    delta = current - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous > 0, delta / previous * 100, np.nan)
+
+    order = np.argsort(-np.abs(delta), kind="stable")
+    return [
+        {"category": series.categories[i], "current": round(float(current[i]), 2),
+         "previous": round(float(previous[i]), 2), "delta": round(float(delta[i]), 2),
+         "change": None if np.isnan(change[i]) else round(float(change[i]), 1)}
+        for i in order if current[i] or previous[i]
+    ]
+
+def forecast_month(series, goal, today, history=FORECAST_HISTORY_MONTHS):
+    # End-of-month savings for today's month: spending so far plus the remaining
+    # days at the average daily spend of the previous `history` months; income
+    # is what has arrived or, if more, the average monthly income of those months
+    today = _to_day(today)
+    month = _month_number(today)
+    start, end = _month_start(month), _month_start(month + 1)
+    window_start = _month_start(month - history)
+
+    income_to_date = int(series.income_cents[(series.income_day >= start) & (series.income_day <= today)].sum())
+    expense_to_date = int(series.expense_cents[(series.expense_day >= start) & (series.expense_day <= today)].sum())
+    past_income = int(series.income_cents[(series.income_day >= window_start) & (series.income_day < start)].sum())
+    past_expense = int(series.expense_cents[(series.expense_day >= window_start) & (series.expense_day < start)].sum())
+
+    if past_expense:
+        daily_spend = past_expense / (start - window_start)
+    else:
+        daily_spend = expense_to_date / (today - start + 1)
+    projected_expense = expense_to_date + daily_spend * (end - 1 - today)
+    projected_income = max(income_to_date, past_income / history)
+    projected_balance = (projected_income - projected_expense) / 100
+
+    return {
+        "month": _month_name(month),
+        "through": _from_day(today).isoformat(),
+        "income_to_date": income_to_date / 100,
+        "expense_to_date": expense_to_date / 100,
+        "projected_income": round(projected_income / 100, 2),
+        "projected_expense": round(projected_expense / 100, 2),
+        "projected_balance": round(projected_balance, 2),
+        "goal": goal,
+        "goal_gap": None if goal is None else round(projected_balance - goal, 2),
+        "on_track": None if goal is None else projected_balance >= goal,
+    }
+
+@instrumented
+def get_analytics(user_id, today=None, window=ROLLING_WINDOW):
+    # Trends, category deltas for today's month and the month-end forecast.
+    # Cache the result with read_cache.call(..., version=...) like other reads.
+    today = today or date.today()
+    series = cached_series(user_id)
+    month = _month_name(_month_number(_to_day(today)))
+    return {
+        "rows": len(series),
+        "trend": monthly_trend(series, window),
+        "category_deltas": category_deltas(series, month),
+        "forecast": forecast_month(series, get_savings_goal(user_id), today),
+    }
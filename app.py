@@ -1,226 +1,302 @@
-import streamlit as st
-from datetime import date
-import matplotlib.pyplot as plt
-
-from auth import login_ui, create_user_table
-from functions import (
-    create_table,
-    create_recurring_tables,
-    apply_due_recurring,
-    add_income,
-    add_expense,
-    get_summary,
-    get_expense_by_category,
-    filter_income,
-    filter_expense,
-    export_to_csv,
-    get_savings_goal,
-    set_savings_goal,
-    generate_monthly_pdf,
-    get_budget_tips
-)
-
-# Setup
-st.set_page_config(page_title="MyBudgetMate", layout="centered")
-st.markdown("""
-    <style>
-        body {
-            background-color: #0f0f0f;
-            color: #e0e0e0;
-        }
-        .stApp {
-            background-color: #111;
-        }
-        .modern-title {
-            font-family: 'Segoe UI', sans-serif;
-            font-size: 48px;
-            color: white;
-            position: relative;
-            display: inline-block;
-        }
-        .modern-title::after {
-            content: '';
-            position: absolute;
-            width: 100%;
-            transform: scaleX(0);
-            height: 3px;
-            bottom: -6px;
-            left: 0;
-            background: linear-gradient(to right, #00f2ff, #8f00ff);
-            transform-origin: bottom right;
-            transition: transform 0.4s ease-out;
-        }
-        .modern-title:hover::after {
-            transform: scaleX(1);
-            transform-origin: bottom left;
-        }
-    </style>
-""", unsafe_allow_html=True)
-create_user_table()
-
-# Session init
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
-
-# Login screen
-if not st.session_state["logged_in"]:
-    login_ui()
-    st.stop()
-
-# App starts here
-create_table()
-create_recurring_tables()
-username = st.session_state["user"]
-apply_due_recurring(username)
-
-st.markdown("""
-    <div style="text-align: center; margin-top: -40px; margin-bottom: 20px;">
-        <h1 class="modern-title">💸 MyBudgetMate</h1>
-        <div style="font-size: 16px; color: #ddd; font-style: italic;">Paisaannu Sookshichu Chilavakkuka Elle Nammuk Jeevikkan ee Kalathu Paadannu ✌🏻</div>
-    </div>
-""", unsafe_allow_html=True)
-st.caption(f"🔐 Logged in as: `{username}`")
-
-mode = st.sidebar.selectbox("Choose Action", ["➕ Add Income", "➖ Add Expense", "📊 View Summary"])
-
-# ➕ Add Income
-if mode == "➕ Add Income":
-    st.header("➕ Add Income")
-    amount = st.number_input("Amount", min_value=0.0, step=10.0)
-    source = st.text_input("Source", placeholder="e.g. Salary, Gift")
-    in_date = st.date_input("Date", value=date.today())
-    if st.button("Save Income"):
-        if amount and source:
-            add_income(amount, source, in_date.strftime("%Y-%m-%d"), username)
-            st.success("✅ Income added!")
-        else:
-            st.warning("Please fill all fields.")
-
-# ➖ Add Expense
-elif mode == "➖ Add Expense":
-    st.header("➖ Add Expense")
-    amount = st.number_input("Amount", min_value=0.0, step=10.0)
-    category = st.selectbox("Category", ["Food", "Transport", "Rent", "Shopping", "Other"])
-    note = st.text_input("Note", placeholder="e.g. Bus fare, Lunch")
-    ex_date = st.date_input("Date", value=date.today())
-    if st.button("Save Expense"):
-        if amount and category:
-            add_expense(amount, category, note, ex_date.strftime("%Y-%m-%d"), username)
-            st.success("✅ Expense added!")
-        else:
-            st.warning("Please fill all fields.")
-
-# 📊 View Summary
-elif mode == "📊 View Summary":
-    st.header("📊 Budget Summary")
-
-    total_income, total_expense, balance, df_income, df_expense = get_summary(username)
-
-    # 🎯 Set Savings Goal
-    with st.expander("🎯 Monthly Savings Goal"):
-        current_goal = get_savings_goal(username)
-        new_goal = st.number_input("Set Monthly Goal (₹)", value=current_goal or 0.0, step=100.0)
-        if st.button("💾 Save Goal"):
-            set_savings_goal(username, new_goal)
-            st.success("✅ Goal saved!")
-
-    # 🧮 Show goal progress
-    if current_goal:
-        progress = balance / current_goal if current_goal != 0 else 0
-        if progress < 0:
-            st.error(f"🚨 Overspent! ₹{abs(balance):.2f} over the goal ₹{current_goal:.2f}")
-        elif progress >= 1:
-            st.success(f"🎉 Goal Reached! Saved ₹{balance:.2f} of ₹{current_goal:.2f}")
-        else:
-            st.info(f"Progress: ₹{balance:.2f} / ₹{current_goal:.2f}")
-            st.progress(min(progress, 1.0))
-
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Total Income", f"₹{total_income:.2f}")
-    col2.metric("Total Expense", f"₹{total_expense:.2f}")
-    col3.metric("Balance", f"₹{balance:.2f}")
-
-    st.subheader("📌 Expense by Category")
-    df_cat = get_expense_by_category(username)
-    if not df_cat.empty:
-        fig, ax = plt.subplots()
-        ax.pie(df_cat['total'], labels=df_cat['category'], autopct='%1.1f%%', startangle=90)
-        ax.axis('equal')
-        st.pyplot(fig)
-    else:
-        st.info("No expense data to show chart.")
-
-    st.markdown("### 📅 Filter by Date / Category")
-    col1, col2 = st.columns(2)
-    start = col1.date_input("From Date", value=date(2024, 1, 1))
-    end = col2.date_input("To Date", value=date.today())
-    filter_cat = st.selectbox("Expense Category", ["All", "Food", "Transport", "Rent", "Shopping", "Other"])
-
-    if st.button("🔍 Apply Filters"):
-        f_income = filter_income(start, end, username)
-        f_expense = filter_expense(start, end, username, filter_cat)
-
-        st.subheader("📋 Filtered Income")
-        st.download_button(
-            "⬇️ Download Filtered Income",
-            export_to_csv(f_income),
-            file_name="filtered_income.csv",
-            mime="text/csv"
-        )
-        st.dataframe(f_income.sort_values("date", ascending=False))
-
-        st.subheader("📋 Filtered Expenses")
-        st.download_button(
-            "⬇️ Download Filtered Expenses",
-            export_to_csv(f_expense),
-            file_name="filtered_expense.csv",
-            mime="text/csv"
-        )
-        st.dataframe(f_expense.sort_values("date", ascending=False))
-
-    st.subheader("⬇️ Export Full Data")
-    col1, col2 = st.columns(2)
-    with col1:
-        st.download_button("📥 Download Income CSV", export_to_csv(df_income), file_name="income.csv")
-    with col2:
-        st.download_button("📥 Download Expense CSV", export_to_csv(df_expense), file_name="expenses.csv")
-
-    st.subheader("📄 Monthly PDF Report")
-    if st.button("📥 Download PDF Report"):
-        month_label = date.today().strftime("%B %Y")
-        path = generate_monthly_pdf(username, df_income, df_expense, total_income, total_expense, balance, month_label)
-        with open(path, "rb") as f:
-            st.download_button(
-                label="📄 Download Cheyiyam Ningalude Chilavukal (PDF)",
-                data=f,
-                file_name=path,
-                mime="application/pdf"
-            )
-
-    st.subheader("Kurachu Upadhesham Aavam 😁")
-    tips = get_budget_tips(username)
-    if tips:
-        for tip in tips:
-            st.info(tip)
-    else:
-        st.success("🎉 You're doing great! No suggestions right now.")
-
-    st.subheader("📋 Recent Transactions")
-    with st.expander("Income Records"):
-        st.dataframe(df_income.sort_values("date", ascending=False))
-    with st.expander("Expense Records"):
-        st.dataframe(df_expense.sort_values("date", ascending=False))
-
-# Logout
-st.sidebar.markdown("---")
-if st.sidebar.button("🚪 Logout"):
-    st.session_state["logged_in"] = False
-    st.experimental_rerun()
-
-# Footer
-st.markdown("""
-    <hr style="margin-top:50px; border: none; height: 1px; background: #444;">
-    <div style="text-align:center; color:#999; font-size: 14px; margin-top: 10px;">
-        © 2025 | Published by Aju Krishna
-    </div>
-""", unsafe_allow_html=True)
+import streamlit as st
+from datetime import date
+import matplotlib.pyplot as plt
+
+from auth import login_ui
+from analytics import get_analytics
+from cache import read_cache
+from profiling import DEBUG_PANEL, rerun_stats, start_rerun, to_json, to_prometheus
+from migrate_schema import ensure_shards
+from functions import (
+    add_income,
+    add_expense,
+    count_transactions,
+    get_data_version,
+    get_user_snapshot,
+    page_transactions,
+    PAGE_SIZE,
+    export_transactions_csv,
+    set_savings_goal,
+    generate_monthly_pdf,
+    get_budget_tips
+)
+
+# Setup
+start_rerun()
+st.set_page_config(page_title="MyBudgetMate", layout="centered")
+st.markdown("""
+    <style>
+        body {
+            background-color: #0f0f0f;
+            color: #e0e0e0;
+        }
+        .stApp {
+            background-color: #111;
+        }
+        .modern-title {
+            font-family: 'Segoe UI', sans-serif;
+            font-size: 48px;
+            color: white;
+            position: relative;
+            display: inline-block;
+        }
+        .modern-title::after {
+            content: '';
+            position: absolute;
+            width: 100%;
+            transform: scaleX(0);
+            height: 3px;
+            bottom: -6px;
+            left: 0;
+            background: linear-gradient(to right, #00f2ff, #8f00ff);
+            transform-origin: bottom right;
+            transition: transform 0.4s ease-out;
+        }
+        .modern-title:hover::after {
+            transform: scaleX(1);
+            transform-origin: bottom left;
+        }
+    </style>
+""", unsafe_allow_html=True)
+# Schema migrations run once per process, not on every rerun
+ensure_shards()
+
+# Session init
+if "logged_in" not in st.session_state:
+    st.session_state["logged_in"] = False
+
+# Login screen (sessions from before user ids were kept in state log in again)
+if not st.session_state["logged_in"] or "user_id" not in st.session_state:
+    login_ui()
+    st.stop()
+
+# App starts here
+username = st.session_state["user"]
+user_id = st.session_state["user_id"]
+
+st.markdown("""
+    <div style="text-align: center; margin-top: -40px; margin-bottom: 20px;">
+        <h1 class="modern-title">💸 MyBudgetMate</h1>
+        <div style="font-size: 16px; color: #ddd; font-style: italic;">Paisaannu Sookshichu Chilavakkuka Elle Nammuk Jeevikkan ee Kalathu Paadannu ✌🏻</div>
+    </div>
+""", unsafe_allow_html=True)
+st.caption(f"🔐 Logged in as: `{username}`")
+
+# 📄 One keyset page at a time; the cursor stack lives in session state and is
+# keyed by the filters, so changing them starts again from the newest page.
+# The row count is cached per data version (Streamlit runs collapsed
+# expanders on every rerun too).
+def paged_table(kind, user_id, version, **filters):
+    key = f"pages_{user_id}_{kind}_" + "_".join(f"{name}={value}" for name, value in sorted(filters.items()))
+    cursors = st.session_state.setdefault(key, [None])
+    df, next_cursor, _ = page_transactions(kind, user_id, after=cursors[-1], **filters)
+    total = read_cache.call(count_transactions, user_id, kind, filters.get("start_date"), filters.get("end_date"),
+                            filters.get("category"), filters.get("search"), version=version)
+    st.dataframe(df)
+
+    pages = max(1, -(-total // PAGE_SIZE))
+    col1, col2, col3 = st.columns([1, 2, 1])
+    col1.button("⬅️ Newer", key=f"{key}_newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+    col2.caption(f"Page {len(cursors)} of {pages} ({total} rows)")
+    col3.button("Older ➡️", key=f"{key}_older", disabled=next_cursor is None,
+                on_click=cursors.append, args=(next_cursor,))
+
+mode = st.sidebar.selectbox("Choose Action", ["➕ Add Income", "➖ Add Expense", "📊 View Summary"])
+
+# ➕ Add Income
+if mode == "➕ Add Income":
+    st.header("➕ Add Income")
+    amount = st.number_input("Amount", min_value=0.0, step=10.0)
+    source = st.text_input("Source", placeholder="e.g. Salary, Gift")
+    in_date = st.date_input("Date", value=date.today())
+    if st.button("Save Income"):
+        if amount and source:
+            add_income(amount, source, in_date.strftime("%Y-%m-%d"), user_id)
+            st.success("✅ Income added!")
+        else:
+            st.warning("Please fill all fields.")
+
+# ➖ Add Expense
+elif mode == "➖ Add Expense":
+    st.header("➖ Add Expense")
+    amount = st.number_input("Amount", min_value=0.0, step=10.0)
+    category = st.selectbox("Category", ["Food", "Transport", "Rent", "Shopping", "Other"])
+    note = st.text_input("Note", placeholder="e.g. Bus fare, Lunch")
+    ex_date = st.date_input("Date", value=date.today())
+    if st.button("Save Expense"):
+        if amount and category:
+            add_expense(amount, category, note, ex_date.strftime("%Y-%m-%d"), user_id)
+            st.success("✅ Expense added!")
+        else:
+            st.warning("Please fill all fields.")
+
+# 📊 View Summary
+elif mode == "📊 View Summary":
+    st.header("📊 Budget Summary")
+
+    # One version lookup per rerun; the snapshot (totals, goal, tip inputs) is a
+    # single query and stays cached until the next write
+    version = get_data_version(user_id)
+    snapshot = read_cache.call(get_user_snapshot, user_id, date.today().strftime("%Y-%m"), version=version)
+    total_income, total_expense, balance = snapshot["total_income"], snapshot["total_expense"], snapshot["balance"]
+    by_category = snapshot["by_category"]
+
+    # 🎯 Set Savings Goal
+    with st.expander("🎯 Monthly Savings Goal"):
+        current_goal = snapshot["goal"]
+        new_goal = st.number_input("Set Monthly Goal (₹)", value=current_goal or 0.0, step=100.0)
+        if st.button("💾 Save Goal"):
+            set_savings_goal(user_id, new_goal)
+            st.success("✅ Goal saved!")
+
+    # 🧮 Show goal progress
+    if current_goal:
+        progress = balance / current_goal if current_goal != 0 else 0
+        if progress < 0:
+            st.error(f"🚨 Overspent! ₹{abs(balance):.2f} over the goal ₹{current_goal:.2f}")
+        elif progress >= 1:
+            st.success(f"🎉 Goal Reached! Saved ₹{balance:.2f} of ₹{current_goal:.2f}")
+        else:
+            st.info(f"Progress: ₹{balance:.2f} / ₹{current_goal:.2f}")
+            st.progress(min(progress, 1.0))
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Income", f"₹{total_income:.2f}")
+    col2.metric("Total Expense", f"₹{total_expense:.2f}")
+    col3.metric("Balance", f"₹{balance:.2f}")
+
+    st.subheader("📌 Expense by Category")
+    if by_category:
+        fig, ax = plt.subplots()
+        ax.pie(list(by_category.values()), labels=list(by_category.keys()), autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+        st.pyplot(fig)
+    else:
+        st.info("No expense data to show chart.")
+
+    st.subheader("📈 Trends & Forecast")
+    # Computed from the user's transactions as NumPy arrays; cached per data version
+    analysis = read_cache.call(get_analytics, user_id, date.today(), version=version)
+    trend, forecast = analysis["trend"], analysis["forecast"]
+    if trend["months"]:
+        st.line_chart({
+            "Income": dict(zip(trend["months"], trend["income"])),
+            "Expense": dict(zip(trend["months"], trend["expense"])),
+            "Expense (3-month avg)": dict(zip(trend["months"], trend["rolling_expense"])),
+        })
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Spent so far", f"₹{forecast['expense_to_date']:.2f}")
+        col2.metric("Projected month-end spend", f"₹{forecast['projected_expense']:.2f}")
+        col3.metric("Projected savings", f"₹{forecast['projected_balance']:.2f}",
+                    None if forecast["goal_gap"] is None else f"₹{forecast['goal_gap']:.2f} vs goal")
+        if analysis["category_deltas"]:
+            st.dataframe([
+                {"Category": d["category"], "This month": d["current"], "Last month": d["previous"],
+                 "Change": d["delta"], "Change %": d["change"]}
+                for d in analysis["category_deltas"]
+            ])
+    else:
+        st.info("No transactions yet to show trends.")
+
+    st.markdown("### 📅 Filter by Date / Category")
+    col1, col2 = st.columns(2)
+    start = col1.date_input("From Date", value=date(2024, 1, 1))
+    end = col2.date_input("To Date", value=date.today())
+    filter_cat = st.selectbox("Expense Category", ["All", "Food", "Transport", "Rent", "Shopping", "Other"])
+    search = st.text_input("Search notes / sources", placeholder="e.g. groceries, salary")
+
+    if st.button("🔍 Apply Filters"):
+        st.session_state["filters"] = {"start_date": start, "end_date": end, "category": filter_cat,
+                                       "search": search.strip()}
+
+    filters = st.session_state.get("filters")
+    if filters:
+        st.subheader("📋 Filtered Income")
+        if st.button("📥 Prepare Filtered Income CSV"):
+            st.download_button(
+                "⬇️ Download Filtered Income",
+                b"".join(export_transactions_csv('income', user_id, filters["start_date"], filters["end_date"],
+                                                search=filters.get("search"))),
+                file_name="filtered_income.csv",
+                mime="text/csv"
+            )
+        paged_table('income', user_id, version, start_date=filters["start_date"], end_date=filters["end_date"],
+                    search=filters.get("search"))
+
+        st.subheader("📋 Filtered Expenses")
+        if st.button("📥 Prepare Filtered Expense CSV"):
+            st.download_button(
+                "⬇️ Download Filtered Expenses",
+                b"".join(export_transactions_csv('expense', user_id, **filters)),
+                file_name="filtered_expense.csv",
+                mime="text/csv"
+            )
+        paged_table('expense', user_id, version, **filters)
+
+    st.subheader("⬇️ Export Full Data")
+    # Exports are streamed from SQLite only once the user asks for them
+    compress = st.checkbox("Compress exports (.csv.gz)")
+    suffix, mime = (".csv.gz", "application/gzip") if compress else (".csv", "text/csv")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📥 Prepare Income CSV"):
+            st.download_button("📥 Download Income CSV",
+                               b"".join(export_transactions_csv('income', user_id, compress=compress)),
+                               file_name=f"income{suffix}", mime=mime)
+    with col2:
+        if st.button("📥 Prepare Expense CSV"):
+            st.download_button("📥 Download Expense CSV",
+                               b"".join(export_transactions_csv('expense', user_id, compress=compress)),
+                               file_name=f"expenses{suffix}", mime=mime)
+
+    st.subheader("📄 Monthly PDF Report")
+    report_month = st.date_input("Report Month", value=date.today()).strftime("%Y-%m")
+    if st.button("📥 Download PDF Report"):
+        pdf = read_cache.call(generate_monthly_pdf, user_id, report_month, version=version)
+        st.download_button(
+            label="📄 Download Cheyiyam Ningalude Chilavukal (PDF)",
+            data=pdf,
+            file_name=f"{username}_{report_month}_report.pdf",
+            mime="application/pdf"
+        )
+
+    st.subheader("Kurachu Upadhesham Aavam 😁")
+    tips = get_budget_tips(user_id, snapshot)
+    if tips:
+        for tip in tips:
+            st.info(tip)
+    else:
+        st.success("🎉 You're doing great! No suggestions right now.")
+
+    st.subheader("📋 Recent Transactions")
+    with st.expander("Income Records"):
+        paged_table('income', user_id, version)
+    with st.expander("Expense Records"):
+        paged_table('expense', user_id, version)
+
+# Logout
+st.sidebar.markdown("---")
+if st.sidebar.button("🚪 Logout"):
+    st.session_state["logged_in"] = False
+    st.experimental_rerun()
+
+# 🐞 Profiling panel (only when MYBUDGETMATE_DEBUG is set)
+if DEBUG_PANEL and st.sidebar.checkbox("🐞 Show profiling"):
+    stats = rerun_stats()
+    st.sidebar.markdown("**This rerun**")
+    st.sidebar.dataframe([
+        {"function": name, "calls": s["calls"], "ms": round(s["seconds"] * 1000, 2),
+         "sql": s["statements"], "rows": s["rows"], "KiB": round(s["bytes"] / 1024, 1)}
+        for name, s in sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True)
+    ])
+    st.sidebar.caption(f"Read cache: {read_cache.stats()}")
+    st.sidebar.download_button("⬇️ Rerun stats (JSON)", to_json(stats), file_name="rerun_stats.json")
+    st.sidebar.download_button("⬇️ Process metrics (Prometheus)", to_prometheus(), file_name="metrics.txt")
+
+# Footer
+st.markdown("""
+    <hr style="margin-top:50px; border: none; height: 1px; background: #444;">
+    <div style="text-align:center; color:#999; font-size: 14px; margin-top: 10px;">
+        © 2025 | Published by Aju Krishna
+    </div>
+""", unsafe_allow_html=True)
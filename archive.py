@@ -0,0 +1,158 @@
+# archive.py
+# Move closed months of transactions out of SQLite into Parquet files
+# partitioned by user and year (<archive dir>/user_id=<id>/year=<yyyy>/).
+# Rollups keep the archived totals, and filtered reads, paged tables, CSV
+# exports, PDF reports and analytics read the archived rows back in
+# transparently.
+#   python archive.py                              keep the last 12 months hot, all users
+#   python archive.py --before 2024-01 --user alice
+#   python archive.py --before 2023                 whole years before 2023
+#   python archive.py --list [--user alice]
+# Needs pyarrow (pip install pyarrow); the app only needs it to read archives.
+import argparse
+import bisect
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime
+
+from auth import get_user_id
+from db import archive_dir, connection, write
+from functions import _MONTH_OF_DAY, _bump_version, _day_month, _from_day, _parquet, _to_day, user_db
+from migrate_schema import ensure_shards
+
+KEEP_MONTHS = 12
+ROW_GROUP_ROWS = 65536
+_TABLES = {'income': ("income", ["source"]), 'expense': ("expenses", ["category", "note"])}
+
+def _write_parquet(table, path):
+    # Written to a temporary name, synced, then renamed into place
+    pq = _parquet()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pq.write_table(table, f, compression="zstd", row_group_size=ROW_GROUP_ROWS)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _archive(c, kind, user_id, before_day):
+    # Runs as one write: rows before before_day go to one Parquet file per year,
+    # each file gets a manifest row, their rollup totals move to archived_rollup
+    # and their import hashes to archived_hashes, then the rows are deleted. Files are synced before the commit, so a crash
+    # leaves at most files no manifest row points at.
+    import pyarrow as pa
+    table, text = _TABLES[kind]
+    columns = ["id", "user_id", "amount_cents", *text, "day", "row_hash"]
+    rows = c.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE user_id=? AND day < ? ORDER BY day, id",
+                     (user_id, before_day)).fetchall()
+    if not rows:
+        return 0
+
+    data = dict(zip(columns, map(list, zip(*rows))))
+    days, cents = data["day"], data["amount_cents"]
+    schema = pa.schema([("id", pa.int64()), ("user_id", pa.int64()), ("amount_cents", pa.int64()),
+                        *[(name, pa.string()) for name in text], ("day", pa.int32()), ("row_hash", pa.string())])
+    archived_at = datetime.now().isoformat(timespec="seconds")
+    start = 0
+    while start < len(rows):
+        year = _from_day(days[start]).year
+        end = bisect.bisect_left(days, _to_day(date(year + 1, 1, 1)), start)
+        path = os.path.join(f"user_id={user_id}", f"year={year}",
+                            f"{table}-{_day_month(days[start])}-{_day_month(days[end - 1])}-{uuid.uuid4().hex[:8]}.parquet")
+        _write_parquet(pa.table({name: values[start:end] for name, values in data.items()}, schema=schema),
+                       os.path.join(archive_dir(), path))
+        c.execute('''
+            INSERT INTO archive_manifest (user_id, kind, year, first_day, last_day, rows, total_cents, path, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, kind, year, days[start], days[end - 1], end - start, sum(cents[start:end]), path, archived_at))
+        start = end
+
+    c.execute(f'''
+        INSERT INTO archived_rollup (user_id, month, kind, category, total_cents, count)
+        SELECT user_id, {_MONTH_OF_DAY}, ?, COALESCE({text[0]}, ''), SUM(amount_cents), COUNT(*)
+        FROM {table} WHERE user_id=? AND day < ? GROUP BY {_MONTH_OF_DAY}, COALESCE({text[0]}, '')
+        ON CONFLICT (user_id, month, kind, category)
+        DO UPDATE SET total_cents = total_cents + excluded.total_cents, count = count + excluded.count
+    ''', (kind, user_id, before_day))
+    c.execute(f'''
+        INSERT OR IGNORE INTO archived_hashes (user_id, row_hash)
+        SELECT user_id, row_hash FROM {table} WHERE user_id=? AND day < ? AND row_hash IS NOT NULL
+    ''', (user_id, before_day))
+    c.execute(f"DELETE FROM {table} WHERE user_id=? AND day < ?", (user_id, before_day))
+    _bump_version(c, [user_id])
+    return len(rows)
+
+def archive_user(user_id, before):
+    # Archive a user's income and expenses dated before `before` (a date, or
+    # "YYYY-MM-DD"); returns {kind: rows archived}
+    before_day = _to_day(before)
+    return {kind: write(_archive, kind, user_id, before_day, path=user_db(user_id)) for kind in _TABLES}
+
+def cutoff(before=None, keep_months=KEEP_MONTHS, today=None):
+    # First day of the oldest month that stays in SQLite; only closed months
+    # (before the current one) can be archived
+    this_month = (today or date.today()).replace(day=1)
+    if before:
+        first = date.fromisoformat(f"{before}-01-01" if len(before) == 4 else f"{before}-01")
+    else:
+        months = this_month.year * 12 + this_month.month - 1 - keep_months
+        first = date(months // 12, months % 12 + 1, 1)
+    if first > this_month:
+        raise ValueError(f"{first:%Y-%m} is not a closed month")
+    return first
+
+def manifest(user_id):
+    with connection(user_db(user_id)) as conn:
+        return conn.execute('''
+            SELECT kind, year, first_day, last_day, rows, total_cents, path, archived_at FROM archive_manifest
+            WHERE user_id=? ORDER BY first_day, kind
+        ''', (user_id,)).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed months of transactions to Parquet")
+    parser.add_argument("--user", help="only this username (default: all users)")
+    parser.add_argument("--before", help="archive rows dated before this month (YYYY-MM) or year (YYYY)")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS,
+                        help="without --before, months (before the current one) to keep in SQLite")
+    parser.add_argument("--list", action="store_true", help="show what is archived instead")
+    args = parser.parse_args()
+
+    ensure_shards()
+    if args.user:
+        user_id = get_user_id(args.user)
+        if user_id is None:
+            print(f"❌ Unknown user: {args.user}")
+            return 1
+        users = [(user_id, args.user)]
+    else:
+        with connection() as conn:
+            users = conn.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+
+    if args.list:
+        for user_id, username in users:
+            for kind, year, first_day, last_day, rows, total, path, archived_at in manifest(user_id):
+                print(f"📦 {username} {kind} {year}: {_from_day(first_day)}..{_from_day(last_day)}, {rows} rows, "
+                      f"₹{total / 100:.2f} ({path}, {archived_at})")
+        return 0
+
+    try:
+        before = cutoff(args.before, args.keep_months)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    started = time.perf_counter()
+    archived = 0
+    for user_id, username in users:
+        counts = archive_user(user_id, before)
+        if any(counts.values()):
+            print(f"📦 {username}: {counts['income']} income and {counts['expense']} expense rows", flush=True)
+        archived += sum(counts.values())
+    print(f"✅ Archived {archived} rows dated before {before} for {len(users)} users "
+          f"in {time.perf_counter() - started:.1f}s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# batch_reports.py
+# Month-end job: render every user's monthly PDF report in parallel.
+#   python batch_reports.py --month 2024-05 [--users alice bob] [--out reports] [--workers 8]
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import db
+from db import connection
+from functions import generate_monthly_pdf
+from migrate_schema import ensure_shards
+
+def all_users():
+    # (user_id, username) for every registered user
+    with connection() as conn:
+        return conn.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+
+def named_users(usernames):
+    placeholders = ', '.join('?' * len(usernames))
+    with connection() as conn:
+        return conn.execute(f"SELECT id, username FROM users WHERE username IN ({placeholders}) ORDER BY id",
+                            usernames).fetchall()
+
+def previous_month():
+    return (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+def _render(user, month, out_dir):
+    # Runs in a worker process; ReportLab rendering is CPU-bound
+    user_id, username = user
+    started = time.perf_counter()
+    try:
+        pdf = generate_monthly_pdf(user_id, month)
+    except Exception as e:
+        return {"user_id": user_id, "username": username, "error": repr(e),
+                "seconds": round(time.perf_counter() - started, 4)}
+
+    # Sanitizing can map two usernames to one name; the id keeps files apart
+    file_name = f"{user_id}_{re.sub(r'[^A-Za-z0-9_.-]', '_', username)}_{month}_report.pdf"
+    with open(os.path.join(out_dir, file_name), "wb") as f:
+        f.write(pdf)
+    return {
+        "user_id": user_id,
+        "username": username,
+        "file": file_name,
+        "bytes": len(pdf),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+def run(month, users, out_dir, workers=None):
+    # users: (user_id, username) pairs
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(users) // (workers * 8))
+
+    # Pooled SQLite connections must not be shared with forked workers
+    db.close_all()
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_render, users, [month] * len(users), [out_dir] * len(users),
+                                chunksize=chunksize))
+    elapsed = time.perf_counter() - started
+
+    manifest = {
+        "month": month,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": workers,
+        "users": len(users),
+        "seconds": round(elapsed, 3),
+        "reports_per_second": round(len(users) / elapsed, 1) if elapsed else 0.0,
+        "reports": [r for r in results if "error" not in r],
+        "errors": [r for r in results if "error" in r],
+    }
+    with open(os.path.join(out_dir, f"manifest_{month}.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Render monthly PDF reports for many users")
+    parser.add_argument("--month", default=previous_month(), help="YYYY-MM (default: last month)")
+    parser.add_argument("--users", nargs="*", help="usernames (default: every registered user)")
+    parser.add_argument("--out", default="reports", help="output directory")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    # Migrated here, before the workers fork, so none of them has to
+    ensure_shards()
+    if args.users:
+        users = named_users(args.users)
+        unknown = sorted(set(args.users) - {username for _, username in users})
+        if unknown:
+            print(f"❌ Unknown users: {', '.join(unknown)}")
+            return 1
+    else:
+        users = all_users()
+    manifest = run(args.month, users, args.out, args.workers)
+
+    for report in sorted(manifest["reports"], key=lambda r: r["seconds"], reverse=True)[:5]:
+        print(f"🐢 {report['username']}: {report['seconds']:.3f}s ({report['bytes']} bytes)")
+    for error in manifest["errors"]:
+        print(f"❌ {error['username']}: {error['error']}")
+    print(f"✅ {len(manifest['reports'])} reports for {args.month} in {manifest['seconds']}s "
+          f"({manifest['reports_per_second']}/s on {manifest['workers']} workers) -> {args.out}")
+    return 1 if manifest["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
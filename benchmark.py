@@ -0,0 +1,143 @@
+# benchmark.py
+# Times the functions.py data layer on seeded synthetic data at several scales
+# and writes machine-readable results for comparison against a baseline.
+#   python benchmark.py                                   1k, 100k and 10M rows
+#   python benchmark.py --scales 1000 100000 --out bench.json --baseline old.json
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import analytics
+import db
+import functions
+from synthetic import generate
+
+DEFAULT_SCALES = (1_000, 100_000, 10_000_000)
+
+def cases(user_id):
+    # (name, callable, mutates) -- mutating cases run once, last
+    year = date.today().year - 1
+    series = analytics.load_series(user_id)
+    return [
+        ("get_summary", lambda: functions.get_summary(user_id), False),
+        ("get_transactions", lambda: functions.get_transactions(user_id), False),
+        ("filter_expense", lambda: functions.filter_expense(f"{year}-01-01", f"{year}-12-31", user_id), False),
+        ("filter_expense_category",
+         lambda: functions.filter_expense(f"{year}-01-01", f"{year}-12-31", user_id, "Food"), False),
+        ("page_transactions", lambda: functions.page_transactions('expense', user_id, with_total=True), False),
+        ("get_budget_tips", lambda: functions.get_budget_tips(user_id), False),
+        ("load_series", lambda: analytics.load_series(user_id), False),
+        ("analytics_compute", lambda: analytics_compute(series), False),
+        ("export_to_csv", lambda: functions.export_to_csv(functions.get_transactions(user_id)[1]), False),
+        ("export_transactions_csv",
+         lambda: sum(len(chunk) for chunk in functions.export_transactions_csv('expense', user_id)), False),
+        ("generate_monthly_pdf", lambda: functions.generate_monthly_pdf(user_id, f"{year}-06"), False),
+        ("apply_due_recurring", lambda: functions.apply_due_recurring(), True),
+    ]
+
+def analytics_compute(series):
+    # The vectorized part of get_analytics(), on an already loaded series
+    today = date.today()
+    analytics.monthly_trend(series)
+    analytics.category_deltas(series, today.strftime("%Y-%m"))
+    analytics.forecast_month(series, 1000.0, today)
+
+def measure(fn, repeat):
+    # Best wall time of `repeat` runs, then one traced run for peak Python memory
+    # (SQLite's own page cache is not visible to tracemalloc)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def measure_once(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def run_scale(rows, users, repeat, workdir, seed):
+    # A fresh directory per scale, so shard files (if sharding is on) start empty too
+    db.close_all()
+    scale_dir = os.path.join(workdir, f"bench_{rows}")
+    shutil.rmtree(scale_dir, ignore_errors=True)
+    os.makedirs(scale_dir)
+    db.DB_PATH = os.path.join(scale_dir, "budget.db")
+
+    users = max(1, min(users, rows))
+    started = time.perf_counter()
+    user_ids = generate(users, rows // users, seed=seed)
+    print(f"🧪 {rows} rows / {users} users generated in {time.perf_counter() - started:.1f}s", flush=True)
+
+    results = []
+    for name, fn, mutates in cases(user_ids[0]):
+        seconds, peak = measure_once(fn) if mutates else measure(fn, repeat)
+        results.append({"scale": rows, "users": users, "function": name,
+                        "seconds": round(seconds, 6), "peak_bytes": peak})
+        print(f"   {name:<26} {seconds * 1000:>10.2f} ms  {peak / 1024 / 1024:>8.2f} MiB", flush=True)
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["function"]): r for r in json.load(f)["results"]}
+    for r in results:
+        old = baseline.get((r["scale"], r["function"]))
+        if old and old["seconds"]:
+            print(f"📈 {r['scale']:>10} {r['function']:<26} x{r['seconds'] / old['seconds']:.2f} time, "
+                  f"x{r['peak_bytes'] / max(old['peak_bytes'], 1):.2f} memory")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data layer on synthetic data")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES), help="total rows per run")
+    parser.add_argument("--users", type=int, default=10, help="users per scale (rows are split evenly)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--workdir", help="where the scratch databases go (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="mybudgetmate-bench-")
+    results = []
+    for rows in args.scales:
+        results += run_scale(rows, args.users, args.repeat, workdir, args.seed)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "users": args.users,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
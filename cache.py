@@ -0,0 +1,63 @@
+import os
+import threading
+from collections import OrderedDict
+
+from functions import get_data_version
+
+CACHE_SIZE = int(os.environ.get("MYBUDGETMATE_CACHE_SIZE", "256"))
+
+class ReadCache:
+    # LRU cache for per-user reads. Entries are keyed by the user's data
+    # version, so any write (which bumps the version) invalidates them.
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def call(self, fn, user_id, *args, version=None):
+        if version is None:
+            version = get_data_version(user_id)
+        key = (fn.__name__, user_id, version, args)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = fn(user_id, *args)
+
+        with self._lock:
+            if self._versions.get(user_id, version) < version:
+                # Entries for an older version can never be hit again
+                for stale in [k for k in self._entries if k[1] == user_id and k[2] < version]:
+                    del self._entries[stale]
+            self._versions[user_id] = max(version, self._versions.get(user_id, version))
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.hits = self.misses = 0
+
+read_cache = ReadCache()
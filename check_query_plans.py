@@ -0,0 +1,143 @@
+# check_query_plans.py
+# Runs every query in functions.py / auth.py against a scratch database,
+# captures the SQL actually executed and fails if EXPLAIN QUERY PLAN shows
+# a full table scan for any of them.
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import db
+
+PLANNED = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+FULL_SCAN = re.compile(r"^SCAN (\w+)")
+# Admin statements that touch every user on purpose carry this marker
+ALL_USERS = "/* all users */"
+
+def exercise():
+    # Touch every public read/write path at least once
+    import analytics
+    import archive
+    import auth
+    import functions
+    import importer
+    import scheduler
+
+    auth.add_user("alice", "secret")
+    alice = auth.validate_login("alice", "secret")
+    auth.user_exists("alice")
+    auth.get_user_id("alice")
+
+    functions.add_income(1000.0, "Salary", "2024-01-05", alice)
+    functions.add_expense(120.0, "Food", "Lunch", "2024-01-06", alice)
+    functions.add_recurring_income(50.0, "Rent from flat", "monthly", "2023-11-30", alice)
+    functions.add_recurring_expense(9.99, "Other", "Streaming", "weekly", "2024-01-01", alice)
+    functions.apply_due_recurring(alice)
+    functions.apply_due_recurring()
+    records = [(2, "05/01/2024", "-12.50", "Coffee", None, None), (3, "2024-01-31", "₹1,000", "Bonus", None, None)]
+    importer.import_records(records, alice)
+    importer.import_records(records, alice)
+    scheduler.run_once()
+    functions.get_summary(alice)
+    functions.get_transactions(alice)
+    functions.get_expense_by_category(alice)
+    functions.filter_income("2024-01-01", "2024-12-31", alice)
+    functions.filter_expense("2024-01-01", "2024-12-31", alice)
+    functions.filter_expense("2024-01-01", "2024-12-31", alice, "Food")
+    _, cursor, _ = functions.page_transactions('expense', alice, limit=1, with_total=True)
+    functions.page_transactions('expense', alice, after=cursor, limit=1)
+    functions.page_transactions('expense', alice, "2024-01-01", "2024-12-31", "Food", after=cursor, with_total=True)
+    functions.page_transactions('income', alice, "2024-01-01", "2024-12-31", with_total=True)
+    functions.page_transactions('expense', alice, search="lun", with_total=True)
+    functions.page_transactions('expense', alice, "2024-01-01", "2024-12-31", "Food", after=cursor, search="lunch")
+    functions.page_transactions('income', alice, search="salary", with_total=True)
+    functions.set_savings_goal(alice, 500.0)
+    functions.get_savings_goal(alice)
+    functions.get_data_version(alice)
+    for kind in ("income", "expense"):
+        list(functions.export_transactions_csv(kind, alice))
+    list(functions.export_transactions_csv("expense", alice, "2024-01-01", "2024-12-31", "Food"))
+    list(functions.export_transactions_csv("expense", alice, search="lunch"))
+    functions.get_budget_tips(alice)
+    analytics.get_analytics(alice, "2024-01-20")
+    functions.generate_monthly_pdf(alice, "2024-01")
+    functions.verify_rollup(alice)
+    functions.rebuild_rollup(alice)
+    functions.rebuild_search_index(optimize=True)
+
+    # Archived rows are read back through the manifest
+    archive.archive_user(alice, "2024-01-06")
+    importer.import_records(records, alice)
+    functions.filter_income("2023-01-01", "2024-12-31", alice)
+    functions.filter_expense("2023-01-01", "2024-12-31", alice, "Food")
+    list(functions.export_transactions_csv("expense", alice, "2023-01-01", "2024-12-31"))
+    _, cursor, _ = functions.page_transactions('expense', alice, limit=1, with_total=True)
+    functions.page_transactions('expense', alice, "2023-01-01", "2024-12-31", "Food", after=cursor, with_total=True)
+    functions.page_transactions('income', alice, search="salary", with_total=True)
+    functions.generate_monthly_pdf(alice, "2024-01")
+    analytics.load_series(alice)
+    functions.verify_rollup(alice)
+    functions.rebuild_rollup(alice)
+
+def full_scans(conn, sql):
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    scans = []
+    # Statements are captured as written; NULLs stand in for the bound values
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count("?")):
+        detail = row[3]
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in tables and "INDEX" not in detail:
+            scans.append(detail)
+    return scans
+
+def check():
+    statements = []
+    migrating = []
+
+    def record(sql):
+        if migrating:
+            return
+        if sql.lstrip().upper().startswith(PLANNED) and ALL_USERS not in sql and sql not in statements:
+            statements.append(sql)
+
+    workdir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(workdir, "plans.db")
+    # Migrations rewrite whole tables on purpose and run against older
+    # layouts, and new shard files are created mid-run; neither is recorded
+    import migrate_schema
+
+    def unrecorded(step):
+        def run(*args, **kwargs):
+            migrating.append(True)
+            try:
+                return step(*args, **kwargs)
+            finally:
+                migrating.pop()
+        return run
+
+    migrate_schema.migrate = unrecorded(migrate_schema.migrate)
+    migrate_schema.migrate_shard = unrecorded(migrate_schema.migrate_shard)
+    migrate_schema.ensure_schema()
+    db.add_statement_listener(record)
+    try:
+        exercise()
+    finally:
+        db.remove_statement_listener(record)
+
+    conn = sqlite3.connect(db.DB_PATH)
+    failures = 0
+    for sql in statements:
+        scans = full_scans(conn, sql)
+        if scans:
+            failures += 1
+            print(f"❌ Full table scan: {' '.join(sql.split())}")
+            for detail in scans:
+                print(f"     {detail}")
+    conn.close()
+
+    print(f"Checked {len(statements)} statements, {failures} with full table scans.")
+    return failures == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
@@ -0,0 +1,300 @@
+import glob
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Database location and pool size come from the environment so deployments
+# can move budget.db without touching the code.
+DB_PATH = os.environ.get("MYBUDGETMATE_DB", "budget.db")
+POOL_SIZE = int(os.environ.get("MYBUDGETMATE_DB_POOL_SIZE", "8"))
+# With the write queue on, every write() goes through one writer thread per
+# database that commits up to WRITE_BATCH queued writes per transaction
+WRITE_QUEUE = os.environ.get("MYBUDGETMATE_WRITE_QUEUE", "") not in ("", "0", "false")
+WRITE_BATCH = int(os.environ.get("MYBUDGETMATE_WRITE_BATCH", "64"))
+# Where users' rows live: "single" (everything in DB_PATH), "hash" (user id
+# modulo SHARD_COUNT) or "per_user" (one file per user). Shard files are
+# spread round-robin over SHARD_DIRS (os.pathsep-separated, default: a
+# "shards" directory next to DB_PATH). The users table always stays in DB_PATH.
+SHARDING = os.environ.get("MYBUDGETMATE_SHARDING", "single")
+SHARD_COUNT = int(os.environ.get("MYBUDGETMATE_SHARD_COUNT", "16"))
+SHARD_DIRS = [d for d in os.environ.get("MYBUDGETMATE_SHARD_DIRS", "").split(os.pathsep) if d]
+# Parquet files of archived transactions (default: "archive" next to DB_PATH)
+ARCHIVE_DIR = os.environ.get("MYBUDGETMATE_ARCHIVE_DIR", "")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_writers = {}
+_writers_lock = threading.Lock()
+_statement_listeners = []
+
+def _dispatch_statement(sql):
+    for listener in _statement_listeners:
+        listener(sql)
+
+class _Cursor(sqlite3.Cursor):
+    # Reports each execute()/executemany() once, with the SQL as written:
+    # bound values, per-row re-executions and trigger bodies are never seen
+
+    def execute(self, sql, parameters=()):
+        if _statement_listeners:
+            _dispatch_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _statement_listeners:
+            _dispatch_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+class _Connection(sqlite3.Connection):
+    # Connection.execute() makes its cursor in C, so it is routed through
+    # cursor() here to reach _Cursor (pandas uses cursor() directly)
+
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, factory=_Connection)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _pool(path):
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return pool
+
+@contextmanager
+def connection(path=None):
+    # Borrow a pooled connection; commit on success, roll back on error
+    path = path or DB_PATH
+    pool = _pool(path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open(path)
+
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+class _Writer(threading.Thread):
+    # Owns the only writing connection to one database file. Queued writes
+    # share a transaction (group commit); each runs in its own savepoint so
+    # a failing write is rolled back alone. Futures resolve after the commit.
+
+    def __init__(self, path):
+        super().__init__(name=f"sqlite-writer:{path}", daemon=True)
+        self.path = path
+        self.queue = queue.Queue()
+
+    def run(self):
+        conn = _open(self.path)
+        try:
+            while True:
+                batch = [self.queue.get()]
+                while batch[-1] is not None and len(batch) < WRITE_BATCH:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                self._commit(conn, [item for item in batch if item is not None])
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        if not batch:
+            return
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    outcomes.append((future, fn(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO queued_write")
+                    outcomes.append((future, None, e))
+                conn.execute("RELEASE queued_write")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+def submit_write(fn, *args, path=None):
+    # Queue fn(conn, *args) for the database's writer thread; returns a Future
+    path = path or DB_PATH
+    future = Future()
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = _Writer(path)
+            writer.start()
+        writer.queue.put((fn, args, future))
+    return future
+
+def write(fn, *args, path=None):
+    # Run fn(conn, *args) as one write and return its result: through the
+    # writer queue when MYBUDGETMATE_WRITE_QUEUE is set, otherwise on a pooled
+    # connection. The write lock is taken up front either way, so a writer
+    # never fails to upgrade a read transaction.
+    if WRITE_QUEUE:
+        return submit_write(fn, *args, path=path).result()
+    with connection(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return fn(conn, *args)
+
+def close_all():
+    # Close every pooled connection and stop the writer threads after they
+    # drain their queues (tests, scripts and shutdown)
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+class SingleRouter:
+    # Every user in the main database
+    name = "single"
+
+    def path_for(self, user_id):
+        return DB_PATH
+
+    def paths(self):
+        return [DB_PATH]
+
+class _ShardRouter:
+    pattern = None
+
+    def __init__(self, dirs=None):
+        self._dirs = list(dirs or SHARD_DIRS)
+        self._created = set()
+
+    @property
+    def dirs(self):
+        # Resolved lazily so scripts that repoint DB_PATH get their own shards
+        return self._dirs or [os.path.join(os.path.dirname(DB_PATH) or ".", "shards")]
+
+    def _path(self, n, file_name):
+        directory = self.dirs[n % len(self.dirs)]
+        if directory not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(directory)
+        return os.path.join(directory, file_name)
+
+    def paths(self):
+        # Shard files that exist; new ones are created with accounts (or by reshard.py)
+        return sorted(path for directory in self.dirs for path in glob.glob(os.path.join(directory, self.pattern)))
+
+class HashRouter(_ShardRouter):
+    # A fixed number of shard files; user ids are spread by modulo
+    name = "hash"
+    pattern = "shard_*.db"
+
+    def __init__(self, count=None, dirs=None):
+        super().__init__(dirs)
+        self.count = count or SHARD_COUNT
+
+    def path_for(self, user_id):
+        n = user_id % self.count
+        return self._path(n, f"shard_{n:04d}.db")
+
+class PerUserRouter(_ShardRouter):
+    # One database file per user
+    name = "per_user"
+    pattern = "user_*.db"
+
+    def path_for(self, user_id):
+        return self._path(user_id, f"user_{user_id}.db")
+
+ROUTERS = {router.name: router for router in (SingleRouter, HashRouter, PerUserRouter)}
+_router = None
+
+def get_router():
+    global _router
+    if _router is None:
+        _router = ROUTERS[SHARDING]()
+    return _router
+
+def set_router(router):
+    # Swap the storage router (tools and tests); pooled connections are kept
+    global _router
+    _router = router
+
+def shard_path(user_id):
+    # Database file holding this user's rows
+    return get_router().path_for(user_id)
+
+def for_each_shard(fn, *args, workers=1):
+    # fn(path, *args) on every shard, in parallel threads when workers > 1;
+    # returns the results in shard order. Admin and batch jobs fan out here.
+    paths = get_router().paths()
+    if workers <= 1 or len(paths) <= 1:
+        return [fn(path, *args) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda path: fn(path, *args), paths))
+
+def archive_dir():
+    # Resolved lazily, like shard directories, so scripts that repoint DB_PATH
+    # get their own archive
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(DB_PATH) or ".", "archive")
+
+def add_statement_listener(listener):
+    # listener(sql) is called once per execute()/executemany() on pooled and
+    # writer connections, with the SQL text as written (never bound values)
+    _statement_listeners.append(listener)
+
+def remove_statement_listener(listener):
+    if listener in _statement_listeners:
+        _statement_listeners.remove(listener)
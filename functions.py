@@ -1,280 +1,879 @@
-import sqlite3
-import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from datetime import datetime, timedelta
-
-def create_table():
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-
-    # Create income table with username
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS income (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            amount REAL,
-            source TEXT,
-            date TEXT
-        )
-    ''')
-
-    # Create expenses table with username
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            amount REAL,
-            category TEXT,
-            note TEXT,
-            date TEXT
-        )
-    ''')
-
-    # Create savings goal table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS goals (
-            username TEXT PRIMARY KEY,
-            amount REAL
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-
-def create_recurring_tables():
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS recurring_income (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            amount REAL,
-            source TEXT,
-            frequency TEXT,
-            start_date TEXT,
-            last_added TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS recurring_expense (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            amount REAL,
-            category TEXT,
-            note TEXT,
-            frequency TEXT,
-            start_date TEXT,
-            last_added TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def apply_due_recurring(username):
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-
-    today = datetime.today().date()
-
-    # INCOME
-    for row in c.execute("SELECT * FROM recurring_income WHERE username=?", (username,)).fetchall():
-        last = datetime.strptime(row[6], "%Y-%m-%d").date() if row[6] else datetime.strptime(row[5], "%Y-%m-%d").date()
-        due = False
-        if row[4] == "daily" and last < today:
-            due = True
-        elif row[4] == "weekly" and last + timedelta(days=7) <= today:
-            due = True
-        elif row[4] == "monthly" and (last.month != today.month or last.year != today.year):
-            due = True
-        if due:
-            c.execute("INSERT INTO income (username, amount, source, date) VALUES (?, ?, ?, ?)",
-                      (username, row[2], row[3], today.strftime("%Y-%m-%d")))
-            c.execute("UPDATE recurring_income SET last_added=? WHERE id=?", (today.strftime("%Y-%m-%d"), row[0]))
-
-    # EXPENSE
-    for row in c.execute("SELECT * FROM recurring_expense WHERE username=?", (username,)).fetchall():
-        last = datetime.strptime(row[7], "%Y-%m-%d").date() if row[7] else datetime.strptime(row[5], "%Y-%m-%d").date()
-        due = False
-        if row[5] == "daily" and last < today:
-            due = True
-        elif row[5] == "weekly" and last + timedelta(days=7) <= today:
-            due = True
-        elif row[5] == "monthly" and (last.month != today.month or last.year != today.year):
-            due = True
-        if due:
-            c.execute("INSERT INTO expenses (username, amount, category, note, date) VALUES (?, ?, ?, ?, ?)",
-                      (username, row[2], row[3], row[4], today.strftime("%Y-%m-%d")))
-            c.execute("UPDATE recurring_expense SET last_added=? WHERE id=?", (today.strftime("%Y-%m-%d"), row[0]))
-
-    conn.commit()
-    conn.close()
-
-def add_income(amount, source, date, username):
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO income (username, amount, source, date) VALUES (?, ?, ?, ?)",
-              (username, amount, source, date))
-    conn.commit()
-    conn.close()
-
-def add_expense(amount, category, note, date, username):
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO expenses (username, amount, category, note, date) VALUES (?, ?, ?, ?, ?)",
-              (username, amount, category, note, date))
-    conn.commit()
-    conn.close()
-
-def get_summary(username):
-    conn = sqlite3.connect("budget.db")
-    df_income = pd.read_sql_query("SELECT * FROM income WHERE username=?", conn, params=(username,))
-    df_expense = pd.read_sql_query("SELECT * FROM expenses WHERE username=?", conn, params=(username,))
-    conn.close()
-
-    total_income = df_income['amount'].sum() if not df_income.empty else 0
-    total_expense = df_expense['amount'].sum() if not df_expense.empty else 0
-    balance = total_income - total_expense
-
-    return total_income, total_expense, balance, df_income, df_expense
-
-def get_expense_by_category(username):
-    conn = sqlite3.connect("budget.db")
-    df = pd.read_sql_query(
-        "SELECT category, SUM(amount) as total FROM expenses WHERE username=? GROUP BY category",
-        conn, params=(username,)
-    )
-    conn.close()
-    return df
-
-def filter_income(start_date, end_date, username):
-    conn = sqlite3.connect("budget.db")
-    query = """
-        SELECT * FROM income
-        WHERE date BETWEEN ? AND ? AND username=?
-    """
-    df = pd.read_sql_query(query, conn, params=(start_date, end_date, username))
-    conn.close()
-    return df
-
-def filter_expense(start_date, end_date, username, category=None):
-    conn = sqlite3.connect("budget.db")
-    if category and category != "All":
-        query = """
-            SELECT * FROM expenses
-            WHERE date BETWEEN ? AND ? AND username=? AND category=?
-        """
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date, username, category))
-    else:
-        query = """
-            SELECT * FROM expenses
-            WHERE date BETWEEN ? AND ? AND username=?
-        """
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date, username))
-    conn.close()
-    return df
-
-def export_to_csv(df, filename="data.csv"):
-    return df.to_csv(index=False).encode('utf-8')
-
-def set_savings_goal(username, amount):
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS goals (
-            username TEXT PRIMARY KEY,
-            amount REAL
-        )
-    ''')
-    c.execute('''
-        INSERT OR REPLACE INTO goals (username, amount) VALUES (?, ?)
-    ''', (username, amount))
-    conn.commit()
-    conn.close()
-
-def get_savings_goal(username):
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    c.execute('SELECT amount FROM goals WHERE username=?', (username,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
-
-def generate_monthly_pdf(username, income_df, expense_df, total_income, total_expense, balance, month_label=""):
-    file_path = f"{username}_monthly_report.pdf"
-    c = canvas.Canvas(file_path, pagesize=A4)
-    width, height = A4
-
-    # Header
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, height - 50, f"MyBudgetMate Monthly Report - {month_label}")
-    c.setFont("Helvetica", 12)
-    c.drawString(100, height - 70, f"User: {username}")
-
-    # Summary
-    y = height - 120
-    c.drawString(50, y, f"Total Income: ₹{total_income:.2f}")
-    c.drawString(250, y, f"Total Expense: ₹{total_expense:.2f}")
-    c.drawString(450, y, f"Balance: ₹{balance:.2f}")
-    y -= 30
-
-    # Income Table
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, "Income Records:")
-    y -= 20
-    c.setFont("Helvetica", 10)
-    for i, row in income_df.iterrows():
-        text = f"{row['date']} - ₹{row['amount']} - {row['source']}"
-        c.drawString(60, y, text)
-        y -= 15
-        if y < 50:
-            c.showPage()
-            y = height - 50
-
-    # Expense Table
-    y -= 20
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, "Expense Records:")
-    y -= 20
-    c.setFont("Helvetica", 10)
-    for i, row in expense_df.iterrows():
-        text = f"{row['date']} - ₹{row['amount']} - {row['category']} ({row['note']})"
-        c.drawString(60, y, text)
-        y -= 15
-        if y < 50:
-            c.showPage()
-            y = height - 50
-
-    c.save()
-    return file_path
-
-def get_budget_tips(username):
-    tips = []
-    total_income, total_expense, balance, _, _ = get_summary(username)
-    goal = get_savings_goal(username)
-
-    if total_expense > total_income:
-        tips.append("🚨 You're spending more than you earn! Consider reducing expenses.")
-
-    if goal and balance < goal * 0.5:
-        tips.append("💰 You're below 50% of your savings goal. Try saving more this month.")
-
-    if goal is None:
-        tips.append("🎯 Set a savings goal to track your monthly progress!")
-
-    cat_df = get_expense_by_category(username)
-    if not cat_df.empty:
-        highest = cat_df.sort_values(by='total', ascending=False).iloc[0]
-        if highest['total'] > total_expense * 0.4:
-            tips.append(f"📊 You are spending a lot on {highest['category']} (₹{highest['total']:.2f}). Try to optimize it.")
-
-    conn = sqlite3.connect("budget.db")
-    c = conn.cursor()
-    rec_inc = c.execute("SELECT COUNT(*) FROM recurring_income WHERE username=?", (username,)).fetchone()[0]
-    rec_exp = c.execute("SELECT COUNT(*) FROM recurring_expense WHERE username=?", (username,)).fetchone()[0]
-    conn.close()
-    if rec_inc + rec_exp == 0:
-        tips.append("🔁 You haven't set up any recurring income/expenses. Use it to automate tracking.")
-
-    return tips
+import calendar
+import csv
+import io
+import itertools
+import os
+import re
+import zlib
+import pandas as pd
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import inch
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from db import archive_dir, connection, for_each_shard, shard_path, write
+from profiling import instrumented
+
+# Amounts are stored as integer cents and dates as Unix day numbers; these
+# helpers convert at the API boundary so callers keep seeing rupees and
+# "YYYY-MM-DD" strings. Rollup months are yyyymm integers.
+_EPOCH = date(1970, 1, 1).toordinal()
+
+def _to_cents(amount):
+    return round(float(amount) * 100)
+
+@lru_cache(maxsize=65536)
+def _text_to_day(value):
+    return date.fromisoformat(value[:10]).toordinal() - _EPOCH
+
+def _to_day(value):
+    # "YYYY-MM-DD", date or datetime -> Unix day number
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.toordinal() - _EPOCH
+    return _text_to_day(str(value))
+
+def _from_day(day):
+    return date.fromordinal(day + _EPOCH)
+
+@lru_cache(maxsize=4096)
+def _day_month(day):
+    # Unix day -> yyyymm rollup key
+    value = _from_day(day)
+    return value.year * 100 + value.month
+
+def _month_key(month):
+    # "YYYY-MM" -> yyyymm
+    return int(month[:4]) * 100 + int(month[5:7])
+
+def _month_label(key):
+    return f"{key // 100:04d}-{key % 100:02d}"
+
+def user_db(user_id):
+    # The database file holding this user's rows. Shard files get their schema
+    # when the account is created and are upgraded at process startup
+    # (migrate_schema.ensure_shards), so reads and writes here never run DDL.
+    return shard_path(user_id)
+
+def for_each_db(fn, *args, workers=1):
+    # fn(path, *args) on every shard (just the main database when unsharded)
+    return for_each_shard(fn, *args, workers=workers)
+
+def _bump_version(c, user_ids):
+    c.executemany('''
+        INSERT INTO data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', [(user_id,) for user_id in user_ids])
+
+@instrumented
+def get_data_version(user_id):
+    with connection(user_db(user_id)) as conn:
+        row = conn.execute("SELECT version FROM data_versions WHERE user_id=?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+def _add_to_rollup(c, kind, entries):
+    # entries: (user_id, day, category/source, amount_cents).
+    # Entries are summed per key first so bulk writes upsert each key once.
+    totals = {}
+    for user_id, day, category, cents in entries:
+        key = (user_id, _day_month(day), kind, category or '')
+        total, count = totals.get(key, (0, 0))
+        totals[key] = (total + cents, count + 1)
+    c.executemany('''
+        INSERT INTO monthly_rollup (user_id, month, kind, category, total_cents, count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, month, kind, category)
+        DO UPDATE SET total_cents = total_cents + excluded.total_cents, count = count + excluded.count
+    ''', [(*key, total, count) for key, (total, count) in totals.items()])
+
+_MONTH_OF_DAY = "CAST(strftime('%Y%m', day * 86400, 'unixepoch') AS INTEGER)"
+# Rows moved to Parquet by archive.py count through archived_rollup; rows
+# whose legacy date could not be read have no day and no month
+_ROLLUP_SOURCE = f'''
+    SELECT user_id, month, kind, category, SUM(total_cents), SUM(count) FROM (
+        SELECT user_id, {_MONTH_OF_DAY} AS month, 'income' AS kind, COALESCE(source, '') AS category,
+               SUM(amount_cents) AS total_cents, COUNT(*) AS count
+        FROM income {{where}} AND day IS NOT NULL GROUP BY user_id, {_MONTH_OF_DAY}, COALESCE(source, '')
+        UNION ALL
+        SELECT user_id, {_MONTH_OF_DAY}, 'expense', COALESCE(category, ''), SUM(amount_cents), COUNT(*)
+        FROM expenses {{where}} AND day IS NOT NULL GROUP BY user_id, {_MONTH_OF_DAY}, COALESCE(category, '')
+        UNION ALL
+        SELECT user_id, month, kind, category, total_cents, count FROM archived_rollup {{where}}
+    ) GROUP BY user_id, month, kind, category
+'''
+
+def _rollup_scope(user_id):
+    # Rows without an owner (from databases older than per-user data) are
+    # invisible to every user and stay out of the rollup
+    if user_id is None:
+        return "WHERE user_id IS NOT NULL /* all users */", ()
+    return "WHERE user_id=?", (user_id, user_id, user_id)
+
+def _rebuild_rollup(c, user_id=None):
+    where, params = _rollup_scope(user_id)
+    c.execute(f"DELETE FROM monthly_rollup {where}", params[:1])
+    c.execute(f"INSERT INTO monthly_rollup (user_id, month, kind, category, total_cents, count) "
+              f"{_ROLLUP_SOURCE.format(where=where)}", params)
+    c.execute(f"UPDATE data_versions SET version = version + 1 {where}", params[:1])
+
+@instrumented
+def rebuild_rollup(user_id=None):
+    # Recompute monthly_rollup from the raw income/expenses rows
+    if user_id is None:
+        for_each_db(lambda path: write(_rebuild_rollup, path=path))
+    else:
+        write(_rebuild_rollup, user_id, path=user_db(user_id))
+
+@instrumented
+def rebuild_search_index(optimize=False):
+    # Re-read every income source and expense note into the FTS indexes (after
+    # bulk edits made with triggers off, or a corrupted index); optimize merges
+    # the index segments for the fastest lookups
+    def rebuild(conn):
+        for fts, _ in _SEARCH.values():
+            conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+            if optimize:
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")
+    for_each_db(lambda path: write(rebuild, path=path))
+
+@instrumented
+def verify_rollup(user_id=None):
+    # Compare monthly_rollup against the raw tables; returns the drifted keys as
+    # (user_id, "YYYY-MM", kind, category, rollup_total, actual_total)
+    where, params = _rollup_scope(user_id)
+    actual, stored = {}, {}
+    for path in ([user_db(user_id)] if user_id is not None else for_each_db(lambda path: path)):
+        with connection(path) as conn:
+            actual.update((row[:4], row[4]) for row in conn.execute(_ROLLUP_SOURCE.format(where=where), params))
+            stored.update((row[:4], row[4]) for row in conn.execute(
+                f"SELECT user_id, month, kind, category, total_cents FROM monthly_rollup {where}", params[:1]))
+
+    # Totals are integer cents, so any difference at all is drift
+    drift = []
+    for user, month, kind, category in sorted(actual.keys() | stored.keys()):
+        key = (user, month, kind, category)
+        expected, found = actual.get(key, 0), stored.get(key, 0)
+        if expected != found:
+            drift.append((user, _month_label(month), kind, category, found / 100, expected / 100))
+    return drift
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# kind -> (template table, target table, copied columns); amount comes first
+# and the category/source second so both kinds feed the rollup the same way.
+# Templates keep rupee amounts and text dates; postings are converted.
+_RECURRING = {
+    'income': ("recurring_income", "income", ("amount", "source")),
+    'expense': ("recurring_expense", "expenses", ("amount", "category", "note")),
+}
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def _occurrence(start, frequency, n):
+    # n-th occurrence counted from start_date; monthly keeps the start day-of-month
+    if frequency == "daily":
+        return start + timedelta(days=n)
+    if frequency == "weekly":
+        return start + timedelta(weeks=n)
+    return _add_months(start, n)
+
+def _occurrence_index(start, frequency, day):
+    # Index of the last occurrence on or before `day`
+    if frequency == "daily":
+        return (day - start).days
+    if frequency == "weekly":
+        return (day - start).days // 7
+    n = (day.year - start.year) * 12 + day.month - start.month
+    return n if _occurrence(start, frequency, n) <= day else n - 1
+
+def _first_due(start, frequency, last_added):
+    # Rows posted before next_due existed only know when they last posted
+    if last_added is None:
+        return start
+    if frequency == "monthly":
+        # ...and used to post at most once per calendar month
+        n = (last_added.year - start.year) * 12 + last_added.month - start.month + 1
+    else:
+        n = _occurrence_index(start, frequency, last_added) + 1
+    return _occurrence(start, frequency, max(n, 0))
+
+def _post_recurring(c, kind, today, user_id=None):
+    template, target, columns = _RECURRING[kind]
+    query = f"""
+        SELECT id, user_id, frequency, start_date, last_added, next_due, {', '.join(columns)}
+        FROM {template}
+        WHERE (next_due IS NULL OR next_due <= ?) AND frequency IN ({', '.join('?' * len(FREQUENCIES))})
+    """
+    params = [today.isoformat(), *FREQUENCIES]
+    if user_id is not None:
+        query += " AND user_id=?"
+        params.append(user_id)
+
+    postings, schedule, rollup = [], [], []
+    for row_id, user, frequency, start_date, last_added, next_due, *values in c.execute(query, params).fetchall():
+        start = _parse_date(start_date)
+        due = _parse_date(next_due) if next_due else _first_due(start, frequency, _parse_date(last_added) if last_added else None)
+        n = _occurrence_index(start, frequency, due)
+        cents = _to_cents(values[0])
+        while due <= today:
+            day = _to_day(due)
+            postings.append((user, cents, *values[1:], day))
+            rollup.append((user, day, values[1], cents))
+            last_added = due.isoformat()
+            n += 1
+            due = _occurrence(start, frequency, n)
+        schedule.append((last_added, due.isoformat(), row_id))
+
+    placeholders = ', '.join('?' * (len(columns) + 2))
+    c.executemany(f"INSERT INTO {target} (user_id, amount_cents, {', '.join(columns[1:])}, day) "
+                  f"VALUES ({placeholders})", postings)
+    c.executemany(f"UPDATE {template} SET last_added=?, next_due=? WHERE id=?", schedule)
+    _add_to_rollup(c, kind, rollup)
+    _bump_version(c, {posting[0] for posting in postings})
+    return len(postings)
+
+@instrumented
+def apply_due_recurring(user_id=None, today=None):
+    # Post every occurrence missed since last_added, for one user or (user_id
+    # None) for everyone, in one transaction per shard. Returns the rows posted.
+    # write() takes the write lock up front, so concurrent workers never post twice
+    today = today or datetime.today().date()
+    post = lambda c: sum(_post_recurring(c, kind, today, user_id) for kind in _RECURRING)
+    if user_id is None:
+        return sum(for_each_db(lambda path: write(post, path=path)))
+    return write(post, path=user_db(user_id))
+
+@instrumented
+def add_recurring_income(amount, source, frequency, start_date, user_id):
+    def insert(conn):
+        conn.execute('''
+            INSERT INTO recurring_income (user_id, amount, source, frequency, start_date, next_due)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, amount, source, frequency, str(start_date), str(start_date)))
+        _bump_version(conn, [user_id])
+    write(insert, path=user_db(user_id))
+
+@instrumented
+def add_recurring_expense(amount, category, note, frequency, start_date, user_id):
+    def insert(conn):
+        conn.execute('''
+            INSERT INTO recurring_expense (user_id, amount, category, note, frequency, start_date, next_due)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, amount, category, note, frequency, str(start_date), str(start_date)))
+        _bump_version(conn, [user_id])
+    write(insert, path=user_db(user_id))
+
+@instrumented
+def add_income(amount, source, date, user_id):
+    write(insert_transactions, 'income', user_id, [(amount, source, date, None)], path=user_db(user_id))
+
+@instrumented
+def add_expense(amount, category, note, date, user_id):
+    write(insert_transactions, 'expense', user_id, [(amount, category, note, date, None)], path=user_db(user_id))
+
+@instrumented
+def insert_transactions(c, kind, user_id, rows):
+    # Bulk insert on an open cursor, keeping the rollup and data version in step.
+    # rows: (amount, source, date, row_hash) for income,
+    #       (amount, category, note, date, row_hash) for expenses
+    if not rows:
+        return
+    if kind == 'income':
+        rows = [(user_id, _to_cents(amount), source, _to_day(day), row_hash)
+                for amount, source, day, row_hash in rows]
+        c.executemany("INSERT INTO income (user_id, amount_cents, source, day, row_hash) VALUES (?, ?, ?, ?, ?)", rows)
+        _add_to_rollup(c, 'income', [(user_id, row[3], row[2], row[1]) for row in rows])
+    else:
+        rows = [(user_id, _to_cents(amount), category, note, _to_day(day), row_hash)
+                for amount, category, note, day, row_hash in rows]
+        c.executemany("INSERT INTO expenses (user_id, amount_cents, category, note, day, row_hash) "
+                      "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        _add_to_rollup(c, 'expense', [(user_id, row[4], row[2], row[1]) for row in rows])
+    _bump_version(c, [user_id])
+
+# Columns returned to callers, converted back to rupees and "YYYY-MM-DD";
+# bookkeeping columns such as row_hash stay internal
+AMOUNT = "amount_cents / 100.0 AS amount"
+DATE = "date(day * 86400, 'unixepoch') AS date"
+INCOME_COLUMNS = f"id, user_id, {AMOUNT}, source, {DATE}"
+EXPENSE_COLUMNS = f"id, user_id, {AMOUNT}, category, note, {DATE}"
+_EXPORT_TABLES = {'income': ("income", INCOME_COLUMNS), 'expense': ("expenses", EXPENSE_COLUMNS)}
+
+@instrumented
+def get_summary(user_id):
+    # Totals, balance and per-category spend in a single round trip over
+    # monthly_rollup; use get_transactions() for the full history.
+    with connection(user_db(user_id)) as conn:
+        rows = conn.execute("""
+            SELECT kind, category, SUM(total_cents) FROM monthly_rollup
+            WHERE user_id=? GROUP BY kind, category
+        """, (user_id,)).fetchall()
+
+    income_cents = 0
+    by_category = {}
+    for kind, category, total in rows:
+        if kind == 'income':
+            income_cents += total
+        else:
+            by_category[category] = total
+
+    expense_cents = sum(by_category.values())
+    by_category = _by_total(by_category)
+    total_income, total_expense = income_cents / 100, expense_cents / 100
+    balance = (income_cents - expense_cents) / 100
+
+    return total_income, total_expense, balance, by_category
+
+@instrumented
+def get_transactions(user_id):
+    # Full income and expense history as DataFrames, only when rows are needed
+    with connection(user_db(user_id)) as conn:
+        df_income = pd.read_sql_query(f"SELECT {INCOME_COLUMNS} FROM income WHERE user_id=?", conn, params=(user_id,))
+        df_expense = pd.read_sql_query(f"SELECT {EXPENSE_COLUMNS} FROM expenses WHERE user_id=?", conn, params=(user_id,))
+    return df_income, df_expense
+
+@instrumented
+def get_expense_by_category(user_id):
+    with connection(user_db(user_id)) as conn:
+        df = pd.read_sql_query(
+            "SELECT category, SUM(total_cents) / 100.0 as total FROM monthly_rollup WHERE user_id=? AND kind='expense' GROUP BY category",
+            conn, params=(user_id,)
+        )
+    return df
+
+# Archived rows live in Parquet files listed in archive_manifest (see
+# archive.py). pyarrow is only imported once a read actually touches a file.
+_ARCHIVE_COLUMNS = {'income': ["id", "user_id", "amount_cents", "source", "day"],
+                    'expense': ["id", "user_id", "amount_cents", "category", "note", "day"]}
+
+def _parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("This user has archived transactions; reading them needs pyarrow "
+                           "(pip install pyarrow)") from None
+    return pq
+
+def _archive_files(conn, kind, user_id, start_day=None, end_day=None, newest_first=False):
+    # Partition pruning: (path, first_day, last_day) of the files whose day
+    # range overlaps [start_day, end_day]; either bound may be None
+    query = "SELECT path, first_day, last_day FROM archive_manifest WHERE user_id=? AND kind=?"
+    params = [user_id, kind]
+    if start_day is not None:
+        query += " AND last_day >= ?"
+        params.append(start_day)
+    if end_day is not None:
+        query += " AND first_day <= ?"
+        params.append(end_day)
+    query += " ORDER BY last_day DESC" if newest_first else " ORDER BY first_day"
+    return [(os.path.join(archive_dir(), path), first_day, last_day)
+            for path, first_day, last_day in conn.execute(query, params).fetchall()]
+
+def _read_archive(pq, path, kind, start_day=None, end_day=None, category=None, columns=None):
+    # One archive file as a raw DataFrame; row groups outside the day range or
+    # category are skipped by their statistics
+    filters = []
+    if start_day is not None:
+        filters.append(("day", ">=", start_day))
+    if end_day is not None:
+        filters.append(("day", "<=", end_day))
+    if kind == 'expense' and category and category != "All":
+        filters.append(("category", "=", category))
+    return pq.read_table(path, columns=columns or _ARCHIVE_COLUMNS[kind], filters=filters or None).to_pandas()
+
+def _day_range(start_date, end_date):
+    # Date filters apply only as a pair, as in _transaction_filter()
+    return (_to_day(start_date), _to_day(end_date)) if start_date and end_date else (None, None)
+
+def _archived_parts(kind, user_id, start_date=None, end_date=None, category=None, columns=None):
+    # One raw DataFrame per archive file overlapping the range, oldest first
+    start_day, end_day = _day_range(start_date, end_date)
+    with connection(user_db(user_id)) as conn:
+        files = _archive_files(conn, kind, user_id, start_day, end_day)
+    if not files:
+        return
+    pq = _parquet()
+    for path, _, _ in files:
+        yield _read_archive(pq, path, kind, start_day, end_day, category, columns)
+
+def read_archived(kind, user_id, start_date=None, end_date=None, category=None, columns=None):
+    # A user's archived rows as one raw DataFrame (amount_cents, day)
+    parts = list(_archived_parts(kind, user_id, start_date, end_date, category, columns))
+    if not parts:
+        return pd.DataFrame(columns=columns or _ARCHIVE_COLUMNS[kind])
+    return pd.concat(parts, ignore_index=True)
+
+def _matches_search(df, kind, search):
+    # Archived rows are not in the FTS index; the same rule (every word as a
+    # word prefix, any case) applied in pandas
+    _, column = _SEARCH[kind]
+    keep = pd.Series(True, index=df.index)
+    for word in re.findall(r"\w+", search or ""):
+        keep &= df[column].fillna("").str.contains(rf"\b{re.escape(word)}", case=False, regex=True)
+    return df[keep]
+
+def _archive_frame(df, kind):
+    # Raw archived rows -> the columns the SQLite reads return
+    text = ["source"] if kind == 'income' else ["category", "note"]
+    df = df.assign(amount=df["amount_cents"] / 100.0,
+                   date=pd.to_datetime(df["day"], unit="D").dt.strftime("%Y-%m-%d"))
+    return df[["id", "user_id", "amount", *text, "date"]].reset_index(drop=True)
+
+def _archived_frames(kind, user_id, start_date=None, end_date=None, category=None, search=None):
+    # Archived rows per file, oldest first, with the same columns as the SQLite reads
+    for df in _archived_parts(kind, user_id, start_date, end_date, category):
+        if search:
+            df = _matches_search(df, kind, search)
+        if df.empty:
+            continue
+        yield _archive_frame(df.sort_values(["day", "id"], kind="stable"), kind)
+
+def _archived_page(kind, user_id, start_day, end_day, category, search, after, count):
+    # The newest `count` archived rows before the `after` cursor, newest first
+    # (raw columns), or None when no archive file can hold any. Files are read
+    # newest first, stopping once the rest end before the oldest row kept.
+    if after:
+        end_day = after[0] if end_day is None else min(end_day, after[0])
+    with connection(user_db(user_id)) as conn:
+        files = _archive_files(conn, kind, user_id, start_day, end_day, newest_first=True)
+    if not files:
+        return None
+
+    pq = _parquet()
+    page = None
+    for path, _, last_day in files:
+        if page is not None and len(page) >= count and last_day < page["day"].iloc[count - 1]:
+            break
+        df = _read_archive(pq, path, kind, start_day, end_day, category)
+        if search:
+            df = _matches_search(df, kind, search)
+        if after:
+            df = df[(df["day"] < after[0]) | ((df["day"] == after[0]) & (df["id"] < after[1]))]
+        page = df if page is None else pd.concat([page, df], ignore_index=True)
+        page = page.sort_values(["day", "id"], ascending=False, kind="stable").iloc[:count]
+    return page
+
+def _archived_count(kind, user_id, start_date=None, end_date=None, category=None, search=None):
+    # Archived rows matching the filters, reading only the filtered columns
+    _, column = _SEARCH[kind]
+    columns = ["day", column] if search else ["day"]
+    return sum(len(_matches_search(df, kind, search) if search else df)
+               for df in _archived_parts(kind, user_id, start_date, end_date, category, columns))
+
+def _with_archived(df, archived):
+    # Archived rows (older) ahead of the SQLite rows
+    archived = list(archived)
+    return pd.concat([*archived, df], ignore_index=True) if archived else df
+
+@instrumented
+def filter_income(start_date, end_date, user_id):
+    with connection(user_db(user_id)) as conn:
+        query = f"""
+            SELECT {INCOME_COLUMNS} FROM income
+            WHERE day BETWEEN ? AND ? AND user_id=?
+        """
+        df = pd.read_sql_query(query, conn, params=(_to_day(start_date), _to_day(end_date), user_id))
+    return _with_archived(df, _archived_frames('income', user_id, start_date, end_date))
+
+@instrumented
+def filter_expense(start_date, end_date, user_id, category=None):
+    start_day, end_day = _to_day(start_date), _to_day(end_date)
+    with connection(user_db(user_id)) as conn:
+        if category and category != "All":
+            query = f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE day BETWEEN ? AND ? AND user_id=? AND category=?
+            """
+            df = pd.read_sql_query(query, conn, params=(start_day, end_day, user_id, category))
+        else:
+            query = f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE day BETWEEN ? AND ? AND user_id=?
+            """
+            df = pd.read_sql_query(query, conn, params=(start_day, end_day, user_id))
+    return _with_archived(df, _archived_frames('expense', user_id, start_date, end_date, category))
+
+PAGE_SIZE = 50
+
+# FTS5 index and indexed column per kind (see migration 10 in migrate_schema.py)
+_SEARCH = {'income': ("income_fts", "source"), 'expense': ("expenses_fts", "note")}
+
+def _match_query(kind, user_id, text):
+    # Free text -> FTS5 query: every word must appear as a word prefix, and
+    # only this user's rows are matched. None when there is nothing to search.
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    _, column = _SEARCH[kind]
+    return f"owner:u{user_id} AND {column}:(" + " ".join(f'"{word}"*' for word in words) + ")"
+
+def _transaction_filter(kind, user_id, start_date=None, end_date=None, category=None, search=None):
+    # (FROM, WHERE, params) for a user's income/expenses with the date, category
+    # and text filters. A search is driven from the FTS index, so only matching
+    # rows are ever looked up.
+    table, _ = _EXPORT_TABLES[kind]
+    source, where, params = table, "user_id=?", [user_id]
+    match = _match_query(kind, user_id, search)
+    if match:
+        fts, _ = _SEARCH[kind]
+        source = f"(SELECT rowid AS match_id FROM {fts} WHERE {fts} MATCH ?) CROSS JOIN {table} ON id = match_id"
+        params.insert(0, match)
+    if kind == 'expense' and category and category != "All":
+        where += " AND category=?"
+        params.append(category)
+    if start_date and end_date:
+        where += " AND day BETWEEN ? AND ?"
+        params += [_to_day(start_date), _to_day(end_date)]
+    return source, where, params
+
+@instrumented
+def page_transactions(kind, user_id, start_date=None, end_date=None, category=None,
+                      after=None, limit=PAGE_SIZE, with_total=False, search=None):
+    # One page of income/expenses, newest first, using keyset pagination on
+    # (day, id): pass the returned cursor as `after` to get the next page.
+    # `search` keeps only rows whose source/note contains every word (prefixes
+    # count). Archived rows are merged in by the same order. Returns
+    # (df, next_cursor, total); total is None unless with_total (see
+    # count_transactions()).
+    _, columns = _EXPORT_TABLES[kind]
+    source, where, params = _transaction_filter(kind, user_id, start_date, end_date, category, search)
+
+    page_where, page_params = where, list(params)
+    if after:
+        # Row-value comparison lets SQLite seek the (user_id, day) index
+        page_where += " AND (day, id) < (?, ?)"
+        page_params += [after[0], after[1]]
+
+    with connection(user_db(user_id)) as conn:
+        df = pd.read_sql_query(
+            f"SELECT {columns} FROM {source} WHERE {page_where} ORDER BY day DESC, id DESC LIMIT ?",
+            conn, params=(*page_params, limit + 1)
+        )
+    total = count_transactions(user_id, kind, start_date, end_date, category, search) if with_total else None
+
+    # A full page from SQLite only lets archived rows from its oldest day on in
+    start_day, end_day = _day_range(start_date, end_date)
+    if len(df) > limit:
+        oldest = _to_day(df["date"].iloc[-1])
+        start_day = oldest if start_day is None else max(start_day, oldest)
+    archived = _archived_page(kind, user_id, start_day, end_day, category, search, after, limit + 1)
+    if archived is not None and len(archived):
+        df = pd.concat([df, _archive_frame(archived, kind)], ignore_index=True)
+        df = df.sort_values(["date", "id"], ascending=False, kind="stable").iloc[:limit + 1].reset_index(drop=True)
+
+    # The extra row only tells us whether another page exists
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        next_cursor = (_to_day(last["date"]), int(last["id"]))
+    return df, next_cursor, total
+
+@instrumented
+def count_transactions(user_id, kind, start_date=None, end_date=None, category=None, search=None):
+    # Rows page_transactions() pages through with these filters, archived ones
+    # included. Without a date range or search the count is read off
+    # monthly_rollup (which keeps archived months); otherwise it is a COUNT(*)
+    # plus a pass over the archive files in range, so cache it with
+    # read_cache.call(..., version=...).
+    if (start_date and end_date) or _match_query(kind, user_id, search):
+        source, where, params = _transaction_filter(kind, user_id, start_date, end_date, category, search)
+        with connection(user_db(user_id)) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+        return total + _archived_count(kind, user_id, start_date, end_date, category, search)
+
+    query = "SELECT COALESCE(SUM(count), 0) FROM monthly_rollup WHERE user_id=? AND kind=?"
+    params = [user_id, kind]
+    if kind == 'expense' and category and category != "All":
+        query += " AND category=?"
+        params.append(category)
+    with connection(user_db(user_id)) as conn:
+        return conn.execute(query, params).fetchone()[0]
+
+@instrumented
+def export_to_csv(df, filename="data.csv"):
+    return df.to_csv(index=False).encode('utf-8')
+
+def stream_csv(cursor, chunk_size=5000, compress=False, before=()):
+    # Yield encoded CSV straight from a cursor, chunk_size rows at a time.
+    # `before` is batches of rows written ahead of the cursor's (archived rows).
+    # With compress=True the chunks form a single gzip stream.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    writer.writerow([col[0] for col in cursor.description])
+
+    # The final empty batch flushes the header when there are no rows at all
+    for rows in itertools.chain(before, iter(lambda: cursor.fetchmany(chunk_size), []), [[]]):
+        writer.writerows(rows)
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    if compressor:
+        yield compressor.flush()
+
+@instrumented
+def export_transactions_csv(kind, user_id, start_date=None, end_date=None, category=None,
+                            compress=False, chunk_size=5000, search=None):
+    # Streamed CSV export of a user's income or expenses, optionally filtered
+    # like page_transactions(). Archived rows in the range come first, one file
+    # at a time, then the SQLite rows one chunk at a time.
+    _, columns = _EXPORT_TABLES[kind]
+    source, where, params = _transaction_filter(kind, user_id, start_date, end_date, category, search)
+    query = f"SELECT {columns} FROM {source} WHERE {where} ORDER BY day"
+    before = (
+        list(df.iloc[i:i + chunk_size].itertuples(index=False, name=None))
+        for df in _archived_frames(kind, user_id, start_date, end_date, category, search)
+        for i in range(0, len(df), chunk_size)
+    )
+
+    with connection(user_db(user_id)) as conn:
+        yield from stream_csv(conn.execute(query, params), chunk_size, compress, before)
+
+@instrumented
+def set_savings_goal(user_id, amount):
+    def save(c):
+        c.execute('''
+            INSERT OR REPLACE INTO goals (user_id, amount) VALUES (?, ?)
+        ''', (user_id, amount))
+        _bump_version(c, [user_id])
+    write(save, path=user_db(user_id))
+
+@instrumented
+def get_savings_goal(user_id):
+    with connection(user_db(user_id)) as conn:
+        c = conn.cursor()
+        c.execute('SELECT amount FROM goals WHERE user_id=?', (user_id,))
+        row = c.fetchone()
+    return row[0] if row else None
+
+def _month_bounds(month):
+    # "YYYY-MM" (or any date in the month) -> ("YYYY-MM", first day, last day)
+    month = str(month)[:7]
+    first = datetime.strptime(month, "%Y-%m").date()
+    last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    return month, first, last
+
+def _draw_lines(c, lines, y, height):
+    # Write pre-formatted lines 15pt apart, one text object per page
+    per_page = int((height - 100) // 15) + 1
+    while lines:
+        fits = max(int((y - 50) // 15) + 1, 0)
+        if fits == 0:
+            c.showPage()
+            c.setFont("Helvetica", 10)
+            y, fits = height - 50, per_page
+        text = c.beginText(60, y)
+        text.setFont("Helvetica", 10)
+        text.setLeading(15)
+        text.textLines(lines[:fits])
+        c.drawText(text)
+        y -= 15 * len(lines[:fits])
+        lines = lines[fits:]
+    return y
+
+@instrumented
+def generate_monthly_pdf(user_id, month=None):
+    # Render the report for one calendar month into memory and return the PDF
+    # bytes; callers cache them per (user_id, month, data version).
+    month, first, last = _month_bounds(month or datetime.today().date())
+    bounds = (user_id, _to_day(first), _to_day(last))
+    with connection() as conn:
+        username = conn.execute("SELECT username FROM users WHERE id=?", (user_id,)).fetchone()
+    with connection(user_db(user_id)) as conn:
+        totals = dict(conn.execute(
+            "SELECT kind, SUM(total_cents) FROM monthly_rollup WHERE user_id=? AND month=? GROUP BY kind",
+            (user_id, _month_key(month))
+        ).fetchall())
+        income_rows = conn.execute(
+            f"SELECT {DATE}, {AMOUNT}, source FROM income WHERE user_id=? AND day BETWEEN ? AND ? ORDER BY day",
+            bounds
+        ).fetchall()
+        expense_rows = conn.execute(
+            f"SELECT {DATE}, {AMOUNT}, category, note FROM expenses "
+            "WHERE user_id=? AND day BETWEEN ? AND ? ORDER BY day",
+            bounds
+        ).fetchall()
+    # Archived rows of the month, merged in by date
+    archived_income = [row for df in _archived_frames('income', user_id, first, last)
+                       for row in df[["date", "amount", "source"]].itertuples(index=False, name=None)]
+    archived_expense = [row for df in _archived_frames('expense', user_id, first, last)
+                        for row in df[["date", "amount", "category", "note"]].itertuples(index=False, name=None)]
+    income_rows = sorted(archived_income + income_rows, key=lambda row: row[0])
+    expense_rows = sorted(archived_expense + expense_rows, key=lambda row: row[0])
+
+    total_income = totals.get('income', 0) / 100
+    total_expense = totals.get('expense', 0) / 100
+    balance = total_income - total_expense
+    income_lines = [f"{d} - ₹{amount} - {source}" for d, amount, source in income_rows]
+    expense_lines = [f"{d} - ₹{amount} - {category} ({note})" for d, amount, category, note in expense_rows]
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Header
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(100, height - 50, f"MyBudgetMate Monthly Report - {first.strftime('%B %Y')}")
+    c.setFont("Helvetica", 12)
+    c.drawString(100, height - 70, f"User: {username[0] if username else user_id}")
+
+    # Summary
+    y = height - 120
+    c.drawString(50, y, f"Total Income: ₹{total_income:.2f}")
+    c.drawString(250, y, f"Total Expense: ₹{total_expense:.2f}")
+    c.drawString(450, y, f"Balance: ₹{balance:.2f}")
+    y -= 30
+
+    # Income Table
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, "Income Records:")
+    y = _draw_lines(c, income_lines, y - 20, height)
+
+    # Expense Table
+    y -= 20
+    if y < 70:
+        c.showPage()
+        y = height - 50
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, "Expense Records:")
+    _draw_lines(c, expense_lines, y - 20, height)
+
+    c.save()
+    return buffer.getvalue()
+
+def _previous_month(month):
+    first = datetime.strptime(month, "%Y-%m").date()
+    return (first - timedelta(days=1)).strftime("%Y-%m")
+
+def _by_total(totals):
+    # {category: cents} -> {category: rupees}, largest first
+    return {category: total / 100 for category, total in
+            sorted(totals.items(), key=lambda item: item[1], reverse=True)}
+
+@instrumented
+def get_user_snapshot(user_id, month=None):
+    # Everything the dashboard and tip rules need, fetched in one round trip:
+    # all-time totals per category, this/previous month per category, the
+    # savings goal and the number of recurring templates.
+    month = month or datetime.today().strftime("%Y-%m")
+    previous = _previous_month(month)
+    with connection(user_db(user_id)) as conn:
+        rows = conn.execute("""
+            SELECT 'all', kind, category, SUM(total_cents) FROM monthly_rollup
+            WHERE user_id=? GROUP BY kind, category
+            UNION ALL
+            SELECT month, kind, category, total_cents FROM monthly_rollup
+            WHERE user_id=? AND month IN (?, ?)
+            UNION ALL
+            SELECT 'goal', NULL, NULL, amount FROM goals WHERE user_id=?
+            UNION ALL
+            SELECT 'recurring', NULL, NULL,
+                   (SELECT COUNT(*) FROM recurring_income WHERE user_id=?)
+                   + (SELECT COUNT(*) FROM recurring_expense WHERE user_id=?)
+        """, (user_id, user_id, _month_key(month), _month_key(previous), user_id, user_id, user_id)).fetchall()
+
+    # Rollup months come back as yyyymm keys; totals are summed in cents
+    this, last = _month_key(month), _month_key(previous)
+    income = {'all': 0, this: 0, last: 0}
+    spending = {'all': {}, this: {}, last: {}}
+    goal, recurring = None, 0
+    for tag, kind, category, total in rows:
+        if tag == 'goal':
+            goal = total
+        elif tag == 'recurring':
+            recurring = total
+        elif kind == 'income':
+            income[tag] += total
+        else:
+            spending[tag][category] = spending[tag].get(category, 0) + total
+
+    total_expense = sum(spending['all'].values())
+    return {
+        "user_id": user_id,
+        "month": month,
+        "previous_month": previous,
+        "total_income": income['all'] / 100,
+        "total_expense": total_expense / 100,
+        "balance": (income['all'] - total_expense) / 100,
+        "by_category": _by_total(spending['all']),
+        "month_income": income[this] / 100,
+        "month_expense": sum(spending[this].values()) / 100,
+        "month_by_category": _by_total(spending[this]),
+        "previous_by_category": _by_total(spending[last]),
+        "goal": goal,
+        "recurring_count": recurring,
+    }
+
+# Tip rules take a snapshot from get_user_snapshot() and return a tip or None.
+# New rules must only use the snapshot, never query the database themselves.
+TIP_RULES = []
+
+def tip_rule(fn):
+    TIP_RULES.append(fn)
+    return fn
+
+@tip_rule
+def _overspending(snap):
+    if snap["total_expense"] > snap["total_income"]:
+        return "🚨 You're spending more than you earn! Consider reducing expenses."
+
+@tip_rule
+def _below_goal(snap):
+    if snap["goal"] and snap["balance"] < snap["goal"] * 0.5:
+        return "💰 You're below 50% of your savings goal. Try saving more this month."
+
+@tip_rule
+def _no_goal(snap):
+    if snap["goal"] is None:
+        return "🎯 Set a savings goal to track your monthly progress!"
+
+@tip_rule
+def _top_category(snap):
+    if snap["by_category"]:
+        category, total = next(iter(snap["by_category"].items()))
+        if total > snap["total_expense"] * 0.4:
+            return f"📊 You are spending a lot on {category} (₹{total:.2f}). Try to optimize it."
+
+@tip_rule
+def _no_recurring(snap):
+    if snap["recurring_count"] == 0:
+        return "🔁 You haven't set up any recurring income/expenses. Use it to automate tracking."
+
+SPIKE_RATIO = 1.5
+SPIKE_MIN_INCREASE = 500.0
+
+@tip_rule
+def _category_spike(snap):
+    spikes = [
+        (current - snap["previous_by_category"][category], category, current)
+        for category, current in snap["month_by_category"].items()
+        if snap["previous_by_category"].get(category, 0) > 0
+        and current >= snap["previous_by_category"][category] * SPIKE_RATIO
+        and current - snap["previous_by_category"][category] >= SPIKE_MIN_INCREASE
+    ]
+    if spikes:
+        increase, category, current = max(spikes)
+        previous = current - increase
+        return (f"📈 {category} spending is up {increase / previous * 100:.0f}% on last month "
+                f"(₹{current:.2f} vs ₹{previous:.2f}).")
+
+@instrumented
+def get_budget_tips(user_id, snapshot=None):
+    # Pass the snapshot the page already has to avoid any database work here
+    snapshot = snapshot or get_user_snapshot(user_id)
+    return [tip for tip in (rule(snapshot) for rule in TIP_RULES) if tip]
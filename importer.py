@@ -0,0 +1,218 @@
+# importer.py
+# Bulk import of bank statements (CSV or OFX) and CSV backfills.
+#   python importer.py statement.csv --user alice
+#   python importer.py export.ofx --user alice --format ofx
+#   python importer.py expenses.csv --user alice --kind expense --category-col Category
+# Rows are streamed, normalized, de-duplicated by content hash and inserted
+# with executemany, one write transaction per batch.
+import argparse
+import csv
+import hashlib
+import re
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from auth import get_user_id
+from db import write
+from functions import insert_transactions, user_db
+from migrate_schema import ensure_shards
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y", "%d %b %Y", "%d-%b-%Y", "%Y%m%d")
+DEFAULT_CATEGORY = "Other"
+# SQLite's default limit on bound parameters is 999 on older builds, and
+# each hash lookup binds its chunk twice
+_IN_CHUNK = 400
+_CENTS = Decimal("0.01")
+
+@lru_cache(maxsize=65536)
+def parse_date(value, formats=DATE_FORMATS):
+    # Cached: statements repeat the same few thousand dates, and strptime
+    # is by far the most expensive step of an import
+    value = value.strip()
+    if re.fullmatch(r"\d{8}(\d{6})?(\.\d+)?(\[.*\])?", value):
+        value = value[:8]  # OFX: YYYYMMDD[HHMMSS[.XXX]][TZ]
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized date: {value!r}")
+
+def parse_amount(value):
+    # "₹1,234.50", "-12", "(12.00)", "12.00 DR" -> Decimal with sign
+    try:
+        amount = Decimal(value).quantize(_CENTS)  # fast path for plain numbers
+        if amount.is_finite():
+            return amount
+    except InvalidOperation:
+        pass
+    text = value.strip().upper()
+    negative = (text.startswith("(") and text.endswith(")")) or text.endswith("DR") or text.startswith("-")
+    digits = re.sub(r"[^0-9.]", "", text)
+    try:
+        amount = Decimal(digits).quantize(_CENTS)
+    except InvalidOperation:
+        raise ValueError(f"Unrecognized amount: {value!r}")
+    return -amount if negative else amount
+
+def read_csv(path, date_col="Date", amount_col="Amount", desc_col="Description",
+             category_col=None, kind_col=None):
+    # Yields (line, date, amount, description, category, kind) without loading the file
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = [header.index(col) if col in header else None
+                   for col in (date_col, amount_col, desc_col, category_col, kind_col)]
+        if columns[0] is None or columns[1] is None:
+            raise ValueError(f"{path}: missing '{date_col}' or '{amount_col}' column")
+        for line, row in enumerate(reader, start=2):
+            values = [row[i] if i is not None and i < len(row) else None for i in columns]
+            yield (line, values[0] or "", values[1] or "", values[2] or "", values[3], values[4])
+
+_OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+def read_ofx(path):
+    # Streams <STMTTRN> blocks; works for SGML (unclosed tags) and XML OFX
+    fields, start = None, 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line_no, line in enumerate(f, start=1):
+            for tag, value in _OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    fields, start = {}, line_no
+                elif fields is not None:
+                    fields[tag] = value.strip()
+            if fields is not None and "</STMTTRN>" in line.upper():
+                description = " ".join(filter(None, (fields.get("NAME"), fields.get("MEMO"))))
+                yield start, fields.get("DTPOSTED", ""), fields.get("TRNAMT", ""), description, None, None
+                fields = None
+
+def normalize(records, kind=None, date_formats=DATE_FORMATS, errors=None):
+    # Map raw records onto income/expense rows; the hash covers the content plus
+    # how often that content already appeared in this file, so genuine repeats
+    # (two identical coffees on one day) survive while re-imports are skipped.
+    seen = {}
+    for line, raw_date, raw_amount, description, category, row_kind in records:
+        try:
+            day = parse_date(raw_date, date_formats)
+            amount = parse_amount(raw_amount)
+        except ValueError as e:
+            if errors is not None:
+                errors.append((line, str(e)))
+            continue
+
+        target = (row_kind or kind or ("income" if amount >= 0 else "expense")).strip().lower()
+        if target not in ("income", "expense"):
+            if errors is not None:
+                errors.append((line, f"Unknown kind: {target!r}"))
+            continue
+        description = description.strip()
+        content = f"{target}|{day}|{abs(amount)}|{description}|{category or ''}"
+        seen[content] = seen.get(content, 0) + 1
+        row_hash = hashlib.sha1(f"{content}|{seen[content]}".encode("utf-8")).hexdigest()
+
+        if target == "income":
+            yield target, (float(abs(amount)), description, day, row_hash)
+        else:
+            yield target, (float(abs(amount)), category or DEFAULT_CATEGORY, description, day, row_hash)
+
+def _existing_hashes(c, table, user_id, hashes):
+    # Archived rows are gone from the table but keep their hash in archived_hashes
+    found = set()
+    for i in range(0, len(hashes), _IN_CHUNK):
+        chunk = hashes[i:i + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(row[0] for row in c.execute(
+            f"SELECT row_hash FROM {table} WHERE user_id=? AND row_hash IN ({placeholders}) "
+            f"UNION ALL SELECT row_hash FROM archived_hashes WHERE user_id=? AND row_hash IN ({placeholders})",
+            (user_id, *chunk, user_id, *chunk)
+        ))
+    return found
+
+def _flush(c, user_id, batch):
+    # One write per batch; returns (inserted, duplicates). The write lock is
+    # held from before the hash lookup, so two imports of the same statement
+    # cannot both miss each other's rows.
+    inserted = duplicates = 0
+    for kind, table in (("income", "income"), ("expense", "expenses")):
+        rows = batch[kind]
+        if not rows:
+            continue
+        existing = _existing_hashes(c, table, user_id, [row[-1] for row in rows])
+        fresh = [row for row in rows if row[-1] not in existing]
+        insert_transactions(c, kind, user_id, fresh)
+        inserted += len(fresh)
+        duplicates += len(rows) - len(fresh)
+    return inserted, duplicates
+
+def import_records(records, user_id, kind=None, batch_size=5000, date_formats=DATE_FORMATS, progress=None):
+    # Import an iterable of raw records; returns counters for the run
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "errors": []}
+    batch = {"income": [], "expense": []}
+    started = time.perf_counter()
+
+    def flush():
+        inserted, duplicates = write(_flush, user_id, batch, path=user_db(user_id))
+        stats["inserted"] += inserted
+        stats["duplicates"] += duplicates
+        batch["income"], batch["expense"] = [], []
+        if progress:
+            progress(stats, time.perf_counter() - started)
+
+    for target, row in normalize(records, kind, date_formats, stats["errors"]):
+        batch[target].append(row)
+        stats["read"] += 1
+        if stats["read"] % batch_size == 0:
+            flush()
+    flush()
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import bank statements and CSV backfills")
+    parser.add_argument("path")
+    parser.add_argument("--user", required=True, help="username the rows belong to")
+    parser.add_argument("--format", choices=("csv", "ofx"), help="default: from the file extension")
+    parser.add_argument("--kind", choices=("income", "expense"),
+                        help="force every row to this kind (default: sign of the amount)")
+    parser.add_argument("--date-col", default="Date")
+    parser.add_argument("--amount-col", default="Amount")
+    parser.add_argument("--desc-col", default="Description")
+    parser.add_argument("--category-col")
+    parser.add_argument("--kind-col")
+    parser.add_argument("--date-format", action="append", help="strptime format to try (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    ensure_shards()
+    user_id = get_user_id(args.user)
+    if user_id is None:
+        print(f"❌ Unknown user: {args.user}")
+        return 1
+
+    fmt = args.format or ("ofx" if args.path.lower().endswith((".ofx", ".qfx")) else "csv")
+    if fmt == "ofx":
+        records = read_ofx(args.path)
+    else:
+        records = read_csv(args.path, args.date_col, args.amount_col, args.desc_col,
+                           args.category_col, args.kind_col)
+
+    def progress(stats, elapsed):
+        print(f"⏱️ {stats['read']} rows read, {stats['inserted']} inserted, "
+              f"{stats['read'] / elapsed if elapsed else 0:.0f} rows/s", flush=True)
+
+    stats = import_records(records, user_id, args.kind, args.batch_size,
+                           tuple(args.date_format) if args.date_format else DATE_FORMATS, progress)
+
+    for line, error in stats["errors"][:20]:
+        print(f"⚠️ line {line}: {error}")
+    print(f"✅ Imported {stats['inserted']} rows ({stats['duplicates']} duplicates skipped, "
+          f"{len(stats['errors'])} invalid) in {stats['seconds']:.2f}s")
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,589 @@
-# migrate_schema.py
-import sqlite3
-
-def add_column_if_not_exists(cursor, table, column, col_type):
-    # Check if the column already exists
-    cursor.execute(f"PRAGMA table_info({table})")
-    columns = [col[1] for col in cursor.fetchall()]
-    if column not in columns:
-        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
-        print(f"✅ Added '{column}' to '{table}' table.")
-    else:
-        print(f"ℹ️ Column '{column}' already exists in '{table}'.")
-
-def migrate_db():
-    conn = sqlite3.connect("budget.db")
-    cursor = conn.cursor()
-
-    # Add 'username' to both tables if not present
-    add_column_if_not_exists(cursor, "income", "username", "TEXT")
-    add_column_if_not_exists(cursor, "expenses", "username", "TEXT")
-
-    conn.commit()
-    conn.close()
-    print("✅ Migration completed.")
-
-if __name__ == "__main__":
-    migrate_db()
+# migrate_schema.py
+# Versioned schema migrations keyed on PRAGMA user_version.
+#   python migrate_schema.py              apply every pending migration
+#   python migrate_schema.py --status     show the current and latest version
+#   python migrate_schema.py --to 3       stop after migration 3
+# The CLI migrates the main database and every shard file. Each step runs in
+# its own write transaction together with the version bump, so an interrupted
+# run resumes at the first step that did not commit. The app and the CLIs call
+# ensure_shards() once per process; requests never run DDL.
+# Shard files hold only the per-user tables: they are created from the main
+# database's schema, without users or the foreign keys to it, when an account
+# is created or by reshard.py, and later steps must also run on that layout.
+import argparse
+import os
+import re
+import sys
+import threading
+
+import db
+from db import connection
+
+MIGRATIONS = []
+# Tables that only exist in the main database
+MAIN_ONLY = ("users", "scheduler_progress")
+_USER_REFERENCE = re.compile(r"\s+REFERENCES\s+users\s*\(\s*id\s*\)", re.IGNORECASE)
+_migrated = set()
+_migrated_lock = threading.RLock()
+
+def migration(version, description):
+    # Register fn(cursor) as schema step `version`; steps run in version order
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return fn
+    return register
+
+def add_column_if_not_exists(c, table, column, col_type):
+    # Databases created before the versioning existed may already have the column
+    columns = [col[1] for col in c.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+
+@migration(1, "users, income, expenses and goals tables")
+def _base_tables(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS income (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount REAL,
+            source TEXT,
+            date TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount REAL,
+            category TEXT,
+            note TEXT,
+            date TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS goals (
+            username TEXT PRIMARY KEY,
+            amount REAL
+        )
+    ''')
+    # The very first databases predate per-user rows
+    add_column_if_not_exists(c, "income", "username", "TEXT")
+    add_column_if_not_exists(c, "expenses", "username", "TEXT")
+
+@migration(2, "user/date and user/category/date indexes")
+def _transaction_indexes(c):
+    # Every query filters on username, then on date and/or category
+    c.execute("CREATE INDEX IF NOT EXISTS idx_income_user_date ON income (username, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (username, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses (username, category, date)")
+
+@migration(3, "recurring templates with next_due")
+def _recurring_tables(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_income (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount REAL,
+            source TEXT,
+            frequency TEXT,
+            start_date TEXT,
+            last_added TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_expense (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount REAL,
+            category TEXT,
+            note TEXT,
+            frequency TEXT,
+            start_date TEXT,
+            last_added TEXT
+        )
+    ''')
+    add_column_if_not_exists(c, "recurring_income", "next_due", "TEXT")
+    add_column_if_not_exists(c, "recurring_expense", "next_due", "TEXT")
+
+    # The engine only ever looks at rows whose next_due has passed
+    c.execute("DROP INDEX IF EXISTS idx_recurring_income_user")
+    c.execute("DROP INDEX IF EXISTS idx_recurring_expense_user")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_recurring_income_user_due ON recurring_income (username, next_due)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_recurring_expense_user_due ON recurring_expense (username, next_due)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_recurring_income_due ON recurring_income (next_due)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_recurring_expense_due ON recurring_expense (next_due)")
+
+@migration(4, "row_hash columns for import de-duplication")
+def _row_hashes(c):
+    add_column_if_not_exists(c, "income", "row_hash", "TEXT")
+    add_column_if_not_exists(c, "expenses", "row_hash", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_income_user_hash ON income (username, row_hash)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_hash ON expenses (username, row_hash)")
+
+@migration(5, "data_versions and monthly_rollup")
+def _rollup(c):
+    # Bumped by every write so cached reads can tell when a user's data changed
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            username TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Per user/month/category totals, kept in step with every insert
+    new_rollup = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='monthly_rollup'"
+    ).fetchone() is None
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_rollup (
+            username TEXT NOT NULL,
+            month TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, month, kind, category)
+        ) WITHOUT ROWID
+    ''')
+    if new_rollup:
+        # Backfill with this version's layout; later steps convert it. Rows
+        # from before per-user data have no owner and stay out, as they do
+        # everywhere else
+        c.execute('''
+            INSERT INTO monthly_rollup (username, month, kind, category, total, count)
+            SELECT username, substr(date, 1, 7), 'income', COALESCE(source, ''), SUM(amount), COUNT(*)
+            FROM income WHERE username IS NOT NULL AND date IS NOT NULL
+            GROUP BY username, substr(date, 1, 7), COALESCE(source, '')
+            UNION ALL
+            SELECT username, substr(date, 1, 7), 'expense', COALESCE(category, ''), SUM(amount), COUNT(*)
+            FROM expenses WHERE username IS NOT NULL AND date IS NOT NULL
+            GROUP BY username, substr(date, 1, 7), COALESCE(category, '')
+        ''')
+
+@migration(6, "scheduler_progress")
+def _scheduler_progress(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_progress (
+            run_date TEXT PRIMARY KEY,
+            last_username TEXT,
+            users INTEGER NOT NULL DEFAULT 0,
+            posted INTEGER NOT NULL DEFAULT 0,
+            finished_at TEXT
+        )
+    ''')
+
+# Unix day number of a "YYYY-MM-DD" text date; julianday() of 1970-01-01 is 2440587.5
+_TEXT_TO_DAY = "CAST(julianday(substr({0}, 1, 10)) - 2440587.5 AS INTEGER)"
+
+@migration(7, "integer cents and Unix day numbers for income, expenses and rollups")
+def _integer_storage(c):
+    # SQLite cannot change a column's type in place, so each table is rebuilt
+    # and renamed. Row ids (and the AUTOINCREMENT counters) are kept.
+    c.execute('''
+        CREATE TABLE income_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount_cents INTEGER,
+            source TEXT,
+            day INTEGER,
+            row_hash TEXT
+        )
+    ''')
+    c.execute(f'''
+        INSERT INTO income_new (id, username, amount_cents, source, day, row_hash)
+        SELECT id, username, CAST(round(amount * 100) AS INTEGER), source, {_TEXT_TO_DAY.format("date")}, row_hash
+        FROM income
+    ''')
+    c.execute('''
+        CREATE TABLE expenses_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            amount_cents INTEGER,
+            category TEXT,
+            note TEXT,
+            day INTEGER,
+            row_hash TEXT
+        )
+    ''')
+    c.execute(f'''
+        INSERT INTO expenses_new (id, username, amount_cents, category, note, day, row_hash)
+        SELECT id, username, CAST(round(amount * 100) AS INTEGER), category, note, {_TEXT_TO_DAY.format("date")}, row_hash
+        FROM expenses
+    ''')
+    c.execute("DROP TABLE income")
+    c.execute("DROP TABLE expenses")
+    c.execute("ALTER TABLE income_new RENAME TO income")
+    c.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    c.execute("CREATE INDEX idx_income_user_day ON income (username, day)")
+    c.execute("CREATE INDEX idx_expenses_user_day ON expenses (username, day)")
+    c.execute("CREATE INDEX idx_expenses_user_category_day ON expenses (username, category, day)")
+    c.execute("CREATE INDEX idx_income_user_hash ON income (username, row_hash)")
+    c.execute("CREATE INDEX idx_expenses_user_hash ON expenses (username, row_hash)")
+
+    # Month keys become yyyymm integers and totals exact cents; recomputed
+    # from the converted rows rather than converting accumulated floats.
+    # Empty or unparseable legacy dates became NULL days and have no month
+    c.execute("DROP TABLE monthly_rollup")
+    c.execute('''
+        CREATE TABLE monthly_rollup (
+            username TEXT NOT NULL,
+            month INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, month, kind, category)
+        ) WITHOUT ROWID
+    ''')
+    month = "CAST(strftime('%Y%m', day * 86400, 'unixepoch') AS INTEGER)"
+    c.execute(f'''
+        INSERT INTO monthly_rollup (username, month, kind, category, total_cents, count)
+        SELECT username, {month}, 'income', COALESCE(source, ''), SUM(amount_cents), COUNT(*)
+        FROM income WHERE username IS NOT NULL AND day IS NOT NULL GROUP BY username, {month}, COALESCE(source, '')
+        UNION ALL
+        SELECT username, {month}, 'expense', COALESCE(category, ''), SUM(amount_cents), COUNT(*)
+        FROM expenses WHERE username IS NOT NULL AND day IS NOT NULL GROUP BY username, {month}, COALESCE(category, '')
+    ''')
+
+@migration(8, "integer user_id foreign keys instead of usernames")
+def _user_ids(c):
+    # Rows may belong to usernames that never registered (imports, old data);
+    # they get a users row without a password, which can never log in
+    c.execute('''
+        INSERT OR IGNORE INTO users (username, password)
+        SELECT username, NULL FROM income WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM expenses WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM goals WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM recurring_income WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM recurring_expense WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM data_versions WHERE username IS NOT NULL
+        UNION SELECT username, NULL FROM monthly_rollup
+    ''')
+    user_id = "(SELECT id FROM users WHERE users.username = old.username)"
+
+    tables = {
+        "income": ('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users (id),
+            amount_cents INTEGER,
+            source TEXT,
+            day INTEGER,
+            row_hash TEXT
+        ''', "id, amount_cents, source, day, row_hash"),
+        "expenses": ('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users (id),
+            amount_cents INTEGER,
+            category TEXT,
+            note TEXT,
+            day INTEGER,
+            row_hash TEXT
+        ''', "id, amount_cents, category, note, day, row_hash"),
+        "goals": ('''
+            user_id INTEGER PRIMARY KEY REFERENCES users (id),
+            amount REAL
+        ''', "amount"),
+        "recurring_income": ('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users (id),
+            amount REAL,
+            source TEXT,
+            frequency TEXT,
+            start_date TEXT,
+            last_added TEXT,
+            next_due TEXT
+        ''', "id, amount, source, frequency, start_date, last_added, next_due"),
+        "recurring_expense": ('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users (id),
+            amount REAL,
+            category TEXT,
+            note TEXT,
+            frequency TEXT,
+            start_date TEXT,
+            last_added TEXT,
+            next_due TEXT
+        ''', "id, amount, category, note, frequency, start_date, last_added, next_due"),
+        "data_versions": ('''
+            user_id INTEGER PRIMARY KEY REFERENCES users (id),
+            version INTEGER NOT NULL DEFAULT 0
+        ''', "version"),
+    }
+    for table, (columns, copied) in tables.items():
+        c.execute(f"CREATE TABLE {table}_new ({columns})")
+        c.execute(f"INSERT INTO {table}_new (user_id, {copied}) SELECT {user_id}, {copied} FROM {table} AS old")
+        c.execute(f"DROP TABLE {table}")
+        c.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+    c.execute('''
+        CREATE TABLE monthly_rollup_new (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            month INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, kind, category)
+        ) WITHOUT ROWID
+    ''')
+    c.execute(f'''
+        INSERT INTO monthly_rollup_new (user_id, month, kind, category, total_cents, count)
+        SELECT {user_id}, month, kind, category, total_cents, count FROM monthly_rollup AS old
+    ''')
+    c.execute("DROP TABLE monthly_rollup")
+    c.execute("ALTER TABLE monthly_rollup_new RENAME TO monthly_rollup")
+
+    # Progress is only a resume point for today's run; restarting it is safe
+    c.execute("DROP TABLE scheduler_progress")
+    c.execute('''
+        CREATE TABLE scheduler_progress (
+            run_date TEXT PRIMARY KEY,
+            last_user_id INTEGER,
+            users INTEGER NOT NULL DEFAULT 0,
+            posted INTEGER NOT NULL DEFAULT 0,
+            finished_at TEXT
+        )
+    ''')
+
+    c.execute("CREATE INDEX idx_income_user_day ON income (user_id, day)")
+    c.execute("CREATE INDEX idx_expenses_user_day ON expenses (user_id, day)")
+    c.execute("CREATE INDEX idx_expenses_user_category_day ON expenses (user_id, category, day)")
+    c.execute("CREATE INDEX idx_income_user_hash ON income (user_id, row_hash)")
+    c.execute("CREATE INDEX idx_expenses_user_hash ON expenses (user_id, row_hash)")
+    c.execute("CREATE INDEX idx_recurring_income_user_due ON recurring_income (user_id, next_due)")
+    c.execute("CREATE INDEX idx_recurring_expense_user_due ON recurring_expense (user_id, next_due)")
+    c.execute("CREATE INDEX idx_recurring_income_due ON recurring_income (next_due)")
+    c.execute("CREATE INDEX idx_recurring_expense_due ON recurring_expense (next_due)")
+
+@migration(9, "covering day/amount indexes for analytics")
+def _covering_indexes(c):
+    # Same prefixes as before, so date and category filters still use them;
+    # analytics.load_series() reads every row from the index alone
+    c.execute("DROP INDEX IF EXISTS idx_income_user_day")
+    c.execute("DROP INDEX IF EXISTS idx_expenses_user_category_day")
+    c.execute("CREATE INDEX idx_income_user_day_amount ON income (user_id, day, amount_cents)")
+    c.execute("CREATE INDEX idx_expenses_user_category_day_amount ON expenses (user_id, category, day, amount_cents)")
+
+# Full-text indexes over free-text columns: (table, column). Each index also
+# holds an "owner" token (u<user_id>) so a match never leaves the user's rows.
+SEARCH_INDEXES = (("income", "source"), ("expenses", "note"))
+
+@migration(10, "FTS5 search over income sources and expense notes")
+def _search_indexes(c):
+    for table, column in SEARCH_INDEXES:
+        c.execute(f"CREATE VIEW {table}_search AS SELECT id, {column}, 'u' || user_id AS owner FROM {table}")
+        c.execute(f'''
+            CREATE VIRTUAL TABLE {table}_fts USING fts5(
+                {column}, owner, content='{table}_search', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        new = f"new.id, new.{column}, 'u' || new.user_id"
+        old = f"'delete', old.id, old.{column}, 'u' || old.user_id"
+        c.execute(f'''
+            CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, {column}, owner) VALUES ({new});
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column}, owner) VALUES ({old});
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {column}, user_id ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column}, owner) VALUES ({old});
+                INSERT INTO {table}_fts (rowid, {column}, owner) VALUES ({new});
+            END
+        ''')
+        c.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+@migration(11, "archive_manifest and archived_rollup for Parquet archives")
+def _archive_tables(c):
+    # One row per Parquet file written by archive.py; path is relative to the
+    # archive directory
+    c.execute('''
+        CREATE TABLE archive_manifest (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            kind TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            first_day INTEGER NOT NULL,
+            last_day INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            total_cents INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            archived_at TEXT NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX idx_archive_manifest_user_kind_day ON archive_manifest (user_id, kind, last_day)")
+    # Rollup totals of the archived rows, so a rollup rebuild keeps them
+    c.execute('''
+        CREATE TABLE archived_rollup (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            month INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, kind, category)
+        ) WITHOUT ROWID
+    ''')
+
+@migration(12, "archived_hashes so re-imports skip archived rows")
+def _archived_hashes(c):
+    # archive.py deletes rows from income/expenses, and with them the import
+    # hashes importer.py deduplicates against; the hashes are kept here
+    c.execute('''
+        CREATE TABLE archived_hashes (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            row_hash TEXT NOT NULL,
+            PRIMARY KEY (user_id, row_hash)
+        ) WITHOUT ROWID
+    ''')
+    paths = [row[0] for row in c.execute("SELECT path FROM archive_manifest")]
+    if paths:
+        # Files archived before this step hold the only copy of their hashes
+        import pyarrow.parquet as pq
+        for path in paths:
+            table = pq.read_table(os.path.join(db.archive_dir(), path), columns=["user_id", "row_hash"])
+            c.executemany(
+                "INSERT OR IGNORE INTO archived_hashes (user_id, row_hash) VALUES (?, ?)",
+                [row for row in zip(table.column("user_id").to_pylist(), table.column("row_hash").to_pylist())
+                 if row[1] is not None]
+            )
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+def current_version(path=None):
+    with connection(path) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(path=None, target=None, log=None):
+    # Apply pending steps up to target (default: all); returns the versions applied
+    target = latest_version() if target is None else target
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version > target:
+            break
+        with connection(path) as conn:
+            c = conn.cursor()
+            # Re-read under the write lock: another process may have just migrated
+            c.execute("BEGIN IMMEDIATE")
+            if c.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            step(c)
+            c.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+        if log:
+            log(f"✅ Migration {version}: {description}")
+    return applied
+
+def ensure_schema(path=None):
+    # Migrate once per process and database; later calls return immediately
+    path = path or db.DB_PATH
+    if path in _migrated:
+        return
+    with _migrated_lock:
+        if path not in _migrated:
+            migrate(path)
+            _migrated.add(path)
+
+def shard_schema():
+    # The main database's schema minus MAIN_ONLY tables and the references to
+    # users: tables (FTS shadow tables come with their virtual table), then
+    # indexes, views and triggers
+    order = {"table": 0, "index": 1, "view": 2, "trigger": 3}
+    with connection() as conn:
+        rows = conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL").fetchall()
+    virtual = [name for kind, name, _, sql in rows if kind == "table" and sql.upper().startswith("CREATE VIRTUAL")]
+    statements = []
+    for kind, name, table, sql in sorted(rows, key=lambda row: order[row[0]]):
+        shadow = kind == "table" and any(name.startswith(f"{v}_") for v in virtual)
+        if table in MAIN_ONLY or name.startswith("sqlite_") or shadow:
+            continue
+        statements.append(_USER_REFERENCE.sub("", sql))
+    return statements
+
+def create_shard(path):
+    # Give a new shard file the main database's current schema version
+    ensure_schema()
+    version = current_version()
+    statements = shard_schema()
+    with connection(path) as conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        if c.execute("PRAGMA user_version").fetchone()[0]:
+            return
+        for sql in statements:
+            c.execute(sql)
+        c.execute(f"PRAGMA user_version = {int(version)}")
+
+def migrate_shard(path, target=None, log=None):
+    # Create a new shard file, or apply pending steps to an existing one
+    if current_version(path) == 0:
+        create_shard(path)
+        if log:
+            log(f"✅ Created shard {path}")
+        return []
+    return migrate(path, target, log)
+
+def ensure_shard(path):
+    # ensure_schema() for a user's database file; called when an account is
+    # created and by reshard.py, never while serving a request
+    if path == db.DB_PATH:
+        return ensure_schema()
+    if path in _migrated:
+        return
+    with _migrated_lock:
+        if path not in _migrated:
+            migrate_shard(path)
+            _migrated.add(path)
+
+def ensure_shards():
+    # ensure_schema() for the main database and every shard file. Processes
+    # call this once at startup, so a release's new steps reach the shards
+    # before any request or job reads them.
+    ensure_schema()
+    db.for_each_shard(ensure_shard)
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="show the schema version and exit")
+    parser.add_argument("--to", type=int, dest="target", help="stop after this migration")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the space freed by table rebuilds")
+    args = parser.parse_args()
+
+    # The main database (users) and every shard share one migration history
+    paths = [db.DB_PATH] + [path for path in db.for_each_shard(lambda path: path) if path != db.DB_PATH]
+    if args.status:
+        version = current_version()
+        for step_version, description, _ in MIGRATIONS:
+            print(f"{'✅' if step_version <= version else '⏳'} {step_version}: {description}")
+        for path in paths:
+            print(f"ℹ️ {path}: schema version {current_version(path)} of {latest_version()}.")
+        return 0
+
+    for path in paths:
+        if path == db.DB_PATH:
+            applied = migrate(path, target=args.target, log=print)
+        else:
+            applied = migrate_shard(path, target=args.target, log=print)
+        print(f"✅ {path} at version {current_version(path)} ({len(applied)} migrations applied).")
+        if args.vacuum:
+            with connection(path) as conn:
+                conn.execute("VACUUM")
+            print(f"✅ {path} vacuumed.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
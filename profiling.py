@@ -0,0 +1,148 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+import db
+
+# Calls slower than this are logged with the SQL text they ran (no bound values)
+SLOW_CALL_MS = float(os.environ.get("MYBUDGETMATE_SLOW_MS", "250"))
+DEBUG_PANEL = os.environ.get("MYBUDGETMATE_DEBUG", "") not in ("", "0", "false")
+
+logger = logging.getLogger("mybudgetmate.slow")
+
+_local = threading.local()
+_totals = {}
+_totals_lock = threading.Lock()
+
+FIELDS = ("calls", "seconds", "max_seconds", "statements", "rows", "bytes")
+
+def _state():
+    if not hasattr(_local, "statements"):
+        _local.statements = []
+        _local.depth = 0
+        _local.rerun = {}
+    return _local
+
+def _on_statement(sql):
+    # Counted by db's cursors: one per execute()/executemany(), SQL text only
+    state = _state()
+    if state.depth:
+        state.statements.append(sql)
+
+db.add_statement_listener(_on_statement)
+
+def _size(result):
+    # (rows, bytes) materialized by a return value
+    if result is None:
+        return 0, 0
+    if isinstance(result, (bytes, bytearray)):
+        return 0, len(result)
+    if hasattr(result, "memory_usage"):
+        return len(result), int(result.memory_usage(index=True).sum())
+    if isinstance(result, tuple):
+        rows = size = 0
+        for item in result:
+            if isinstance(item, (tuple, list, dict)) or hasattr(item, "memory_usage"):
+                item_rows, item_size = _size(item)
+                rows, size = rows + item_rows, size + item_size
+        return rows, size
+    if isinstance(result, (list, dict)):
+        return len(result), 0
+    return 0, 0
+
+def _add(bucket, name, seconds, statements, rows, size):
+    entry = bucket.setdefault(name, dict.fromkeys(FIELDS, 0))
+    entry["calls"] += 1
+    entry["seconds"] += seconds
+    entry["max_seconds"] = max(entry["max_seconds"], seconds)
+    entry["statements"] += statements
+    entry["rows"] += rows
+    entry["bytes"] += size
+
+def _record(name, started, first_statement, rows, size):
+    state = _state()
+    seconds = time.perf_counter() - started
+    statements = state.statements[first_statement:]
+    state.depth -= 1
+    if state.depth == 0:
+        state.statements = []
+
+    _add(state.rerun, name, seconds, len(statements), rows, size)
+    with _totals_lock:
+        _add(_totals, name, seconds, len(statements), rows, size)
+
+    if seconds * 1000 >= SLOW_CALL_MS:
+        logger.warning("Slow call %s: %.1f ms, %d statements, %d rows, %d bytes%s", name, seconds * 1000,
+                       len(statements), rows, size,
+                       "".join(f"\n    {' '.join(sql.split())[:300]}" for sql in statements[:20]))
+
+def instrumented(fn):
+    # Record wall time, SQL statements, rows and bytes for each call of fn.
+    # Generators are measured until they are exhausted or closed.
+    name = fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            state = _state()
+            state.depth += 1
+            started, first, size = time.perf_counter(), len(state.statements), 0
+            try:
+                for chunk in fn(*args, **kwargs):
+                    size += len(chunk) if isinstance(chunk, (bytes, bytearray)) else 0
+                    yield chunk
+            finally:
+                _record(name, started, first, 0, size)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        state = _state()
+        state.depth += 1
+        started, first = time.perf_counter(), len(state.statements)
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        finally:
+            _record(name, started, first, *_size(result))
+    return wrapper
+
+def start_rerun():
+    # Called at the top of every Streamlit rerun; returns the fresh stats dict
+    state = _state()
+    state.rerun = {}
+    return state.rerun
+
+def rerun_stats():
+    return _state().rerun
+
+def totals():
+    with _totals_lock:
+        return {name: dict(entry) for name, entry in _totals.items()}
+
+def to_json(stats=None):
+    return json.dumps(stats if stats is not None else rerun_stats(), indent=2, sort_keys=True)
+
+def to_prometheus(stats=None):
+    # Prometheus text exposition of the process-wide counters
+    stats = stats if stats is not None else totals()
+    metrics = (
+        ("calls", "mybudgetmate_calls_total", "counter", "Instrumented calls"),
+        ("seconds", "mybudgetmate_call_seconds_total", "counter", "Wall time spent in calls"),
+        ("max_seconds", "mybudgetmate_call_seconds_max", "gauge", "Slowest single call"),
+        ("statements", "mybudgetmate_sql_statements_total", "counter", "SQL statements executed"),
+        ("rows", "mybudgetmate_rows_total", "counter", "Rows returned to callers"),
+        ("bytes", "mybudgetmate_bytes_total", "counter", "Bytes materialized by results"),
+    )
+    lines = []
+    for field, metric, kind, help_text in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name in sorted(stats):
+            lines.append(f'{metric}{{function="{name}"}} {stats[name][field]}')
+    return "\n".join(lines) + "\n"
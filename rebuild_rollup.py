@@ -0,0 +1,38 @@
+# rebuild_rollup.py
+# Recompute or verify the monthly_rollup table from the raw income/expenses rows.
+#   python rebuild_rollup.py [--user NAME]           rebuild
+#   python rebuild_rollup.py --verify [--user NAME]  report drift only
+import argparse
+import sys
+
+from auth import get_user_id
+from functions import rebuild_rollup, verify_rollup
+from migrate_schema import ensure_shards
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify monthly rollups")
+    parser.add_argument("--user", help="only this username (default: all users)")
+    parser.add_argument("--verify", action="store_true", help="report drift without rewriting")
+    args = parser.parse_args()
+
+    ensure_shards()
+    user_id = None
+    if args.user:
+        user_id = get_user_id(args.user)
+        if user_id is None:
+            print(f"❌ Unknown user: {args.user}")
+            return 1
+    drift = verify_rollup(user_id)
+    for drift_user, month, kind, category, found, expected in drift:
+        print(f"⚠️ user {drift_user} {month} {kind} '{category}': rollup ₹{found:.2f}, actual ₹{expected:.2f}")
+
+    if args.verify:
+        print(f"ℹ️ {len(drift)} rollup entries drifted.")
+        return 1 if drift else 0
+
+    rebuild_rollup(user_id)
+    print(f"✅ Rollups rebuilt ({len(drift)} entries corrected).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+# rebuild_search.py
+# Rebuild the full-text search indexes over income sources and expense notes
+# from the raw rows, in the main database and every shard.
+#   python rebuild_search.py              rebuild
+#   python rebuild_search.py --optimize   rebuild and merge index segments
+import argparse
+import sys
+import time
+
+from functions import rebuild_search_index
+from migrate_schema import ensure_shards
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the FTS5 search indexes")
+    parser.add_argument("--optimize", action="store_true", help="merge index segments after rebuilding")
+    args = parser.parse_args()
+
+    ensure_shards()
+    started = time.perf_counter()
+    rebuild_search_index(optimize=args.optimize)
+    print(f"✅ Search indexes rebuilt in {time.perf_counter() - started:.1f}s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# reshard.py
+# Move users' rows into the shard the configured router assigns them, e.g.
+# to split the single budget.db into shards or to change the shard count.
+#   MYBUDGETMATE_SHARDING=hash python reshard.py                  split/rebalance
+#   python reshard.py --strategy hash --shards 64 --dirs /mnt/a /mnt/b
+#   python reshard.py --strategy single                          merge back
+#   python reshard.py --dry-run
+# Sources are the main database plus every shard file found in the target
+# and --from-dirs directories. Stop the app and the scheduler first. Each batch
+# is copied into the target (replacing any half-copied rows from an earlier
+# interrupted run) and only then deleted from the source, so re-running is safe.
+# Every registered user's shard file is created, even for users without rows.
+import argparse
+import glob
+import os
+import sys
+import time
+
+import db
+from db import connection
+from migrate_schema import ensure_schema, ensure_shard
+
+BATCH = 200
+
+def user_tables(path):
+    # (table, copied columns, has id) for every table keyed by user_id;
+    # row ids are reassigned in the target so shards never collide
+    tables = []
+    with connection(path) as conn:
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND sql NOT LIKE 'CREATE VIRTUAL%' ORDER BY name")]
+        for name in names:
+            columns = [col[1] for col in conn.execute(f"PRAGMA table_info({name})")]
+            if "user_id" in columns:
+                tables.append((name, ", ".join(c for c in columns if c != "id"), "id" in columns))
+    return tables
+
+def users_in(path, tables):
+    with connection(path) as conn:
+        query = " UNION ".join(f"SELECT user_id FROM {table} WHERE user_id IS NOT NULL" for table, _, _ in tables)
+        return sorted(row[0] for row in conn.execute(query))
+
+def move(source, target, user_ids, tables):
+    placeholders = ", ".join("?" * len(user_ids))
+    with connection(target) as conn:
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table, columns, has_id in tables:
+                conn.execute(f"DELETE FROM main.{table} WHERE user_id IN ({placeholders})", user_ids)
+                conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} "
+                             f"WHERE user_id IN ({placeholders}){' ORDER BY id' if has_id else ''}", user_ids)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+    with connection(source) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for table, _, _ in tables:
+            conn.execute(f"DELETE FROM {table} WHERE user_id IN ({placeholders})", user_ids)
+
+def sources(router, extra_dirs):
+    # The main database and every shard file any router could have written
+    dirs = set(getattr(router, "dirs", [])) | set(extra_dirs)
+    dirs.add(os.path.join(os.path.dirname(db.DB_PATH) or ".", "shards"))
+    found = {db.DB_PATH}
+    for directory in dirs:
+        for pattern in (db.HashRouter.pattern, db.PerUserRouter.pattern):
+            found.update(glob.glob(os.path.join(directory, pattern)))
+    return sorted(found, key=lambda path: (path != db.DB_PATH, path))
+
+def reshard(router, extra_dirs=(), dry_run=False, log=print):
+    # Returns {target path: users moved in}
+    moved = {}
+    for source in sources(router, extra_dirs):
+        ensure_shard(source)
+        tables = user_tables(source)
+        plan = {}
+        for user_id in users_in(source, tables):
+            target = router.path_for(user_id)
+            if os.path.abspath(target) != os.path.abspath(source):
+                plan.setdefault(target, []).append(user_id)
+
+        for target, user_ids in sorted(plan.items()):
+            log(f"{'🔎' if dry_run else '🚚'} {len(user_ids)} users: {source} -> {target}")
+            moved[target] = moved.get(target, 0) + len(user_ids)
+            if dry_run:
+                continue
+            ensure_shard(target)
+            for i in range(0, len(user_ids), BATCH):
+                move(source, target, user_ids[i:i + BATCH], tables)
+
+    # Users without any rows yet still need their shard file
+    if not dry_run:
+        with connection() as conn:
+            user_ids = [row[0] for row in conn.execute("SELECT id FROM users")]
+        for target in sorted({router.path_for(user_id) for user_id in user_ids}):
+            ensure_shard(target)
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description="Split, rebalance or merge user data across shards")
+    parser.add_argument("--strategy", choices=sorted(db.ROUTERS), default=db.SHARDING,
+                        help="target layout (default: MYBUDGETMATE_SHARDING)")
+    parser.add_argument("--shards", type=int, help="shard count for --strategy hash")
+    parser.add_argument("--dirs", nargs="+", help="shard directories (default: MYBUDGETMATE_SHARD_DIRS)")
+    parser.add_argument("--from-dirs", nargs="*", default=[], help="extra directories holding old shard files")
+    parser.add_argument("--dry-run", action="store_true", help="show the moves without copying anything")
+    args = parser.parse_args()
+
+    if args.strategy == "hash":
+        router = db.HashRouter(args.shards, args.dirs)
+    elif args.strategy == "per_user":
+        router = db.PerUserRouter(args.dirs)
+    else:
+        router = db.SingleRouter()
+
+    ensure_schema()
+    started = time.perf_counter()
+    moved = reshard(router, args.from_dirs, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    print(f"✅ {sum(moved.values())} users {verb} into {len(moved)} databases in {time.perf_counter() - started:.1f}s. "
+          f"Run the app with MYBUDGETMATE_SHARDING={router.name}"
+          + (f" MYBUDGETMATE_SHARD_COUNT={router.count}" if args.strategy == "hash" else "") + ".")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# synthetic.py
+# Seeded synthetic data: N users x M transactions with realistic category,
+# amount and date distributions, for benchmarks and local load testing.
+#   python synthetic.py --users 100 --transactions 10000 --seed 42
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from db import shard_path, write
+from functions import insert_transactions, user_db
+from migrate_schema import ensure_schema, ensure_shard
+
+# category -> (share of expenses, median amount); amounts are log-normal around the median
+EXPENSE_PROFILE = {
+    "Food": (0.40, 180.0),
+    "Transport": (0.22, 60.0),
+    "Shopping": (0.15, 900.0),
+    "Other": (0.20, 250.0),
+    "Rent": (0.03, 12000.0),
+}
+INCOME_SOURCES = {"Salary": (0.6, 45000.0), "Freelance": (0.25, 6000.0), "Gift": (0.15, 1500.0)}
+NOTES = {
+    "Food": ["Lunch", "Groceries", "Dinner out", "Snacks", "Tea"],
+    "Transport": ["Bus fare", "Auto", "Metro", "Fuel", "Cab"],
+    "Shopping": ["Clothes", "Electronics", "Books", "Gifts"],
+    "Other": ["Phone bill", "Medicine", "Haircut", "Subscription"],
+    "Rent": ["Monthly rent"],
+}
+INCOME_SHARE = 0.08
+BATCH = 100_000
+
+def _pick(profile):
+    return list(profile), [share for share, _ in profile.values()]
+
+def generate_user(rng, transactions, start, days):
+    # Returns (income_rows, expense_rows) in the insert_transactions layout
+    categories, category_weights = _pick(EXPENSE_PROFILE)
+    sources, source_weights = _pick(INCOME_SOURCES)
+    n_income = int(transactions * INCOME_SHARE)
+
+    # Weekends see more spending; one weight per day of the span
+    day_weights = [1.4 if (start + timedelta(d)).weekday() >= 5 else 1.0 for d in range(days)]
+    day_strings = [(start + timedelta(d)).isoformat() for d in range(days)]
+
+    income = [
+        (round(INCOME_SOURCES[source][1] * rng.lognormvariate(0, 0.3), 2), source, day, None)
+        for source, day in zip(rng.choices(sources, source_weights, k=n_income),
+                               rng.choices(day_strings, k=n_income))
+    ]
+    expenses = [
+        (round(EXPENSE_PROFILE[category][1] * rng.lognormvariate(0, 0.6), 2), category,
+         rng.choice(NOTES[category]), day, None)
+        for category, day in zip(rng.choices(categories, category_weights, k=transactions - n_income),
+                                 rng.choices(day_strings, day_weights, k=transactions - n_income))
+    ]
+    return income, expenses
+
+def _add_user(conn, username):
+    conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, "synthetic"))
+    return conn.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()[0]
+
+def _insert(conn, user_id, income, expenses):
+    insert_transactions(conn, 'income', user_id, income)
+    insert_transactions(conn, 'expense', user_id, expenses)
+
+def _add_recurring(conn, user_id, due):
+    # A few templates that are ~90 days behind, for the recurring engine
+    conn.execute('''
+        INSERT INTO recurring_income (user_id, amount, source, frequency, start_date, next_due)
+        VALUES (?, ?, 'Salary', 'monthly', ?, ?)
+    ''', (user_id, 45000.0, due, due))
+    conn.executemany('''
+        INSERT INTO recurring_expense (user_id, amount, category, note, frequency, start_date, next_due)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(user_id, 12000.0, "Rent", "Monthly rent", "monthly", due, due),
+          (user_id, 40.0, "Transport", "Bus pass", "daily", due, due),
+          (user_id, 199.0, "Other", "Subscription", "weekly", due, due)])
+
+def generate(users, transactions_per_user, seed=42, start=date(2020, 1, 1), end=None, recurring=True):
+    # Insert a reproducible dataset; returns the ids of the users created
+    ensure_schema()
+    rng = random.Random(seed)
+    end = end or date.today()
+    days = (end - start).days + 1
+    user_ids = []
+
+    for i in range(users):
+        user_id = write(_add_user, f"user{i:06d}")
+        ensure_shard(shard_path(user_id))
+        user_ids.append(user_id)
+
+        # Large users are written in BATCH-sized transactions to bound memory
+        for offset in range(0, transactions_per_user, BATCH):
+            income, expenses = generate_user(rng, min(BATCH, transactions_per_user - offset), start, days)
+            write(_insert, user_id, income, expenses, path=user_db(user_id))
+
+        if recurring:
+            write(_add_recurring, user_id, (end - timedelta(days=90)).isoformat(), path=user_db(user_id))
+    return user_ids
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic budget data")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--transactions", type=int, default=1000, help="transactions per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-recurring", action="store_true")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.users, args.transactions, args.seed, recurring=not args.no_recurring)
+    elapsed = time.perf_counter() - started
+    total = args.users * args.transactions
+    print(f"✅ Generated {total} transactions for {args.users} users in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())